@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import bq.biquad as bq
+import frg.csvdata as csvdata
+import frg.curves as curves
+import frg.impedance as impedance
+import frg.pipeline as pipeline
+import frg.smoothing as smoothing
+import benchmark.generate as generate
+
+# Benchmark of the processing stages on synthetic data sets, run from the FreqRespGraph directory:
+#   python -m benchmark.bench --output new.json --compare baseline.json
+# Each stage is run over all files of a case, the fastest of several repeats is reported. Nothing is drawn, so the
+# benchmark runs headless.
+
+# Bump if stages measure something else, e.g. 2: cached reads include reading the data
+RESULTS_VERSION = 2
+
+# Cases as <spacing>:<points>:<files>
+DEFAULT_CASES = ('log:100:1', 'log:10000:1', 'linear:1000000:1', 'log:480:1000')
+
+STAGES = ('parse', 'cached', 'compensate', 'align', 'smooth', 'peq', 'impedance', 'pipeline')
+
+# Processing settings of the timed stages, similar to the examples of the README
+ALIGNMIN = 200
+ALIGNMAX = 2000
+SMOOTH = 1/12
+PEQ = ((bq.Biquad.LOWSHELF, 40, 1, 6), (bq.Biquad.PEAK, 83, 1.1, -3), (bq.Biquad.PEAK, 4380, 2.0, -3.4), (bq.Biquad.PEAK, 6400, 2.0, -5.3), (bq.Biquad.HIGHSHELF, 8000, 1, -4))
+FPEQ = 48000
+ZEQ_R = (0, 10, 33, 120, 470)
+
+# Differences below this time in seconds are measurement noise and never reported as regression
+NOISE_TIME = 0.001
+
+DEFAULT_WORKDIR = os.path.join(csvdata.DEFAULT_CACHE_DIR, 'benchmark')
+
+
+def createParser():
+    parser = argparse.ArgumentParser(description='Time the processing stages of FreqRespGraph on synthetic measurement data. The data sets are generated once into --workdir and reused.')
+    parser.add_argument('--cases', nargs='*', default=list(DEFAULT_CASES), help='Data sets as <spacing>:<points>:<files>, spacing log or linear, 100...1000000 points, 1...5000 files, default ' + ' '.join(DEFAULT_CASES))
+    parser.add_argument('--stages', nargs='*', choices=STAGES, default=list(STAGES), help='Timed stages, default all')
+    parser.add_argument('--repeat', nargs='?', type=int, default=3, help='Run each stage this number of times and report the fastest run, default 3')
+    parser.add_argument('--workdir', nargs='?', default=DEFAULT_WORKDIR, help='Directory of generated data sets, default ' + DEFAULT_WORKDIR)
+    parser.add_argument('--seed', nargs='?', type=int, default=0, help='Random seed of generated data sets')
+    parser.add_argument('--output', nargs='?', default='', help='Write results to given JSON file')
+    parser.add_argument('--compare', nargs='*', default=[], help='Compare results with given baseline JSON file, or compare two result files without running the benchmark')
+    parser.add_argument('--threshold', nargs='?', type=float, default=0.1, help='Report stages slower than the baseline by more than this fraction as regression, default 0.1')
+    return parser
+
+
+# Parse case string, returns spacing, points and files
+def parseCase(case):
+    try:
+        spacing, points, files = case.split(':')
+        points = int(points)
+        files = int(files)
+    except ValueError:
+        spacing = ''
+    if spacing not in generate.SPACINGS or not generate.POINTS_MIN <= points <= generate.POINTS_MAX or not generate.FILES_MIN <= files <= generate.FILES_MAX:
+        print( 'Invalid case: ', case)
+        print( 'Expected format: log|linear:<100...1000000 points>:<1...5000 files>')
+        sys.exit(1)
+    return spacing, points, files
+
+
+# Time of the fastest of repeat runs of function. An untimed first run does the work done only once per process, e.g.
+# lazy imports of scipy.
+def bestTime(function, repeat):
+    function()
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        t = time.perf_counter() - start
+        best = t if best is None else min(best, t)
+    return best
+
+
+# Functions running each stage over all curves of a data set, input data of the later stages is prepared once
+def stageFunctions(dataset, cachedir):
+    files = dataset['measurements']
+    data = [csvdata.loadCurve(f, ',', None) for f in files]
+    ref = curves.RefCurve(*csvdata.loadCurve(dataset['target'], ',', None))
+    peq = bq.BiquadBank([bq.Biquad(typ, f, FPEQ, q, gain) for typ, f, q, gain in PEQ])
+    xz, z = csvdata.loadCurve(dataset['impedance'], ' ', None)
+    zeq = impedance.ImpedanceEq(xz, z, ZEQ_R)
+    options = pipeline.CurveOptions(ALIGNMIN, ALIGNMAX, ',', ref, peq, zeq, SMOOTH, '1/12', cachedir=None)
+
+    def parse():
+        csvdata.memoryCache.clear()
+        for f in files:
+            csvdata.loadCurve(f, ',', None)
+
+    # Cached curves are memory-mapped, sum them to read the data
+    def cached():
+        csvdata.memoryCache.clear()
+        total = 0
+        for f in files:
+            x, y = csvdata.loadCurve(f, ',', cachedir)
+            total += np.asarray(x).sum() + np.asarray(y).sum()
+        return total
+
+    def pipelineRun():
+        csvdata.memoryCache.clear()
+        for f in files:
+            pipeline.processCurve(f, options, False, False)
+
+    # Fill the parse cache before timing cached reads
+    for f in files:
+        csvdata.loadCurve(f, ',', cachedir)
+    return {
+        'parse': parse,
+        'cached': cached,
+        'compensate': lambda: [curves.compensateCurve(x, y, ref) for x, y in data],
+        'align': lambda: [y - curves.alignOffset(x, y, ALIGNMIN, ALIGNMAX) for x, y in data],
+        'smooth': lambda: [smoothing.smoothCurve(x, y, SMOOTH) for x, y in data],
+        'peq': lambda: [peq.log_result(x) for x, y in data],
+        'impedance': lambda: [zeq.apply(x, y) for x, y in data],
+        'pipeline': pipelineRun,
+    }
+
+
+# Run benchmark, returns list of results of all cases and stages
+def runBenchmark(cases, stages, repeat=3, workdir=DEFAULT_WORKDIR, seed=0):
+    results = []
+    parsed = [(case,) + parseCase(case) for case in cases]
+    print( '%-20s %-12s %10s %14s' % ('Case', 'Stage', 'Time [s]', 'Points/s'))
+    for case, spacing, points, files in parsed:
+        name = generate.datasetName(spacing, points, files, seed)
+        dataset = generate.generateDataset(os.path.join(workdir, name), spacing, points, files, seed)
+        functions = stageFunctions(dataset, os.path.join(workdir, 'cache'))
+        for stage in stages:
+            t = bestTime(functions[stage], repeat)
+            rate = points * files / t if t > 0 else float('inf')
+            print( '%-20s %-12s %10.4f %14.0f' % (case, stage, t, rate))
+            results.append({'case': case, 'spacing': spacing, 'points': points, 'files': files, 'stage': stage, 'time': t, 'points_per_second': rate})
+    csvdata.memoryCache.clear()
+    return results
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def saveResults(filename, results, repeat):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'version': RESULTS_VERSION, 'environment': environment(), 'repeat': repeat, 'results': results}, f, indent=1)
+    print( 'Results written to ', filename)
+
+
+def loadResults(filename):
+    try:
+        with open(filename, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print( 'Invalid benchmark results: ', filename, ' ', e)
+        sys.exit(1)
+    if data.get('version') != RESULTS_VERSION:
+        print( 'Results of another benchmark version, times may not be comparable: ', filename)
+    return data.get('results', [])
+
+
+# Compare results with baseline results of the same cases and stages, returns list of (case, stage, baseline time,
+# time) of stages slower than the baseline by more than threshold
+def compareResults(baseline, results, threshold=0.1):
+    times = {(r['case'], r['stage']): r['time'] for r in baseline}
+    regressions = []
+    print( '%-20s %-12s %10s %10s %8s' % ('Case', 'Stage', 'Base [s]', 'Time [s]', 'Change'))
+    for r in results:
+        key = (r['case'], r['stage'])
+        if key not in times:
+            continue
+        old = times[key]
+        change = r['time'] / old - 1 if old > 0 else 0
+        regression = change > threshold and r['time'] - old > NOISE_TIME
+        print( '%-20s %-12s %10.4f %10.4f %+7.1f%%%s' % (r['case'], r['stage'], old, r['time'], 100 * change, '  REGRESSION' if regression else ''))
+        if regression:
+            regressions.append((r['case'], r['stage'], old, r['time']))
+    return regressions
+
+
+if __name__ == '__main__':
+    args = createParser().parse_args()
+    if len(args.compare) > 2:
+        print( 'Use --compare <baseline> or --compare <baseline> <results>')
+        sys.exit(1)
+    if len(args.compare) == 2:
+        results = loadResults(args.compare[1])
+    else:
+        results = runBenchmark(args.cases, args.stages, max(1, args.repeat), args.workdir, args.seed)
+        if args.output != '':
+            saveResults(args.output, results, args.repeat)
+    if len(args.compare) > 0:
+        regressions = compareResults(loadResults(args.compare[0]), results, args.threshold)
+        if len(regressions) > 0:
+            print( len(regressions), ' stages slower than baseline by more than ', '%g %%' % (100 * args.threshold))
+            sys.exit(1)
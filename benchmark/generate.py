@@ -0,0 +1,93 @@
+import json
+import os
+import numpy as np
+
+# Synthetic measurement data for benchmarks: headphone like frequency responses, an impedance curve with a bass
+# resonance and a target curve, all written as CSV files without header rows. Data sets are reproducible (same seed,
+# same files) and are only written once per directory.
+
+# Frequency range of generated curves
+FMIN = 20.0
+FMAX = 20000.0
+
+# Highest frequency of linearly spaced curves, like an FFT export of a 48 kHz measurement
+LINEAR_FMAX = 24000.0
+
+SPACINGS = ('log', 'linear')
+
+# Limits of generated data sets
+POINTS_MIN = 100
+POINTS_MAX = 1000000
+FILES_MIN = 1
+FILES_MAX = 5000
+
+# Written after all files of a data set, a data set without it is regenerated
+COMPLETE_FILE = 'dataset.json'
+
+
+# Frequencies of given number of points, logarithmically spaced within FMIN...FMAX or linearly spaced up to
+# LINEAR_FMAX without 0 Hz
+def frequencies(points, spacing='log'):
+    if spacing == 'linear':
+        return np.linspace(LINEAR_FMAX / points, LINEAR_FMAX, points)
+    return np.geomspace(FMIN, FMAX, points)
+
+
+# Headphone like response: bass shelf, ear gain around 3 kHz, treble roll off, a few random peaks and measurement noise
+def responseCurve(f, rng):
+    logf = np.log10(f)
+    y = rng.uniform(-2, 6) / (1 + (f / rng.uniform(80, 200))**2)
+    y += rng.uniform(6, 12) * np.exp(-((logf - np.log10(rng.uniform(2500, 3500))) / 0.15)**2)
+    y -= rng.uniform(0, 10) * np.clip(logf - 4, 0, None)
+    for i in range(4):
+        y += rng.uniform(-5, 5) * np.exp(-((logf - rng.uniform(2, 4.3)) / rng.uniform(0.02, 0.1))**2)
+    return 90 + y + rng.normal(0, 0.3, len(f))
+
+
+# Impedance of a dynamic driver with bass resonance and voice coil inductance
+def impedanceCurve(f, rdc=32, fs=80, zmax=200, qm=3):
+    return rdc + (zmax - rdc) / (1 + qm**2 * (f / fs - fs / f)**2) + 2 * np.pi * f * 0.0001
+
+
+# Smooth target curve with bass shelf and ear gain
+def targetCurve(f):
+    logf = np.log10(f)
+    return 6 / (1 + (f / 105)**2) + 9 * np.exp(-((logf - np.log10(3000)) / 0.2)**2) - 4 * np.clip(logf - 4, 0, None)
+
+
+def writeCsv(filename, x, y, csv_delimiter=','):
+    np.savetxt(filename, np.column_stack((x, y)), fmt='%.6g', delimiter=csv_delimiter)
+
+
+# Data set name of given parameters
+def datasetName(spacing, points, files, seed=0):
+    return '%s-%d-%d-%d' % (spacing, points, files, seed)
+
+
+# Write data set of files measurement curves with points frequencies each, an impedance curve (space delimited like
+# REW exports) and a target curve into directory outdir. Returns dictionary of the file names, an existing complete
+# data set is reused.
+def generateDataset(outdir, spacing='log', points=1000, files=1, seed=0):
+    completefile = os.path.join(outdir, COMPLETE_FILE)
+    try:
+        with open(completefile, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    os.makedirs(os.path.join(outdir, 'measurements'), exist_ok=True)
+    rng = np.random.default_rng(seed)
+    f = frequencies(points, spacing)
+    dataset = {'spacing': spacing, 'points': points, 'seed': seed, 'measurements': []}
+    for i in range(files):
+        filename = os.path.join(outdir, 'measurements', 'curve%04d.csv' % i)
+        writeCsv(filename, f, responseCurve(f, rng))
+        dataset['measurements'].append(filename)
+    dataset['impedance'] = os.path.join(outdir, 'impedance.txt')
+    writeCsv(dataset['impedance'], f, impedanceCurve(f), ' ')
+    # Target curves are usually much shorter than the measurements
+    ft = frequencies(min(points, 480), 'log')
+    dataset['target'] = os.path.join(outdir, 'target.csv')
+    writeCsv(dataset['target'], ft, targetCurve(ft))
+    with open(completefile, 'w', encoding='utf-8') as f:
+        json.dump(dataset, f, indent=1)
+    return dataset
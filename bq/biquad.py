@@ -21,6 +21,8 @@
 # ***************************************************************************
 
 import math
+import numpy as np
+from scipy.signal import sosfilt
 
 class Biquad:
 
@@ -150,6 +152,179 @@ class Biquad:
   # return computed constants
   def constants(self):
     return self.a1, self.a2, self.b0, self.b1, self.b2
+
+  # return second-order section b0, b1, b2, a0, a1, a2 of the prescaled constants
+  def sos(self):
+    return np.array([self.b0, self.b1, self.b2, 1, self.a1, self.a2], dtype=np.float64)
     
   def __str__(self):
     return "Type:%d,Freq:%.1f,Rate:%.1f,Q:%.1f,Gain:%.1f" % (self.typ,self.freq,self.srate,self.Q,self.dbGain)
+
+
+class BiquadBank:
+
+  # hold the prescaled constants of a filter chain in arrays, one entry per filter
+  def __init__(self, biquads):
+    self.biquads = list(biquads)
+    self.srate = np.array([b.srate for b in self.biquads], dtype=np.float64)
+    self.a1 = np.array([b.a1 for b in self.biquads], dtype=np.float64)
+    self.a2 = np.array([b.a2 for b in self.biquads], dtype=np.float64)
+    self.b0 = np.array([b.b0 for b in self.biquads], dtype=np.float64)
+    self.b1 = np.array([b.b1 for b in self.biquads], dtype=np.float64)
+    self.b2 = np.array([b.b2 for b in self.biquads], dtype=np.float64)
+
+  def __len__(self):
+    return len(self.biquads)
+
+  # provide static results of every filter for a frequency array f, shape (filters, len(f))
+  def results(self, f):
+    f = np.asarray(f, dtype=np.float64)
+    srate = self.srate[:, None]
+    b0 = self.b0[:, None]
+    b1 = self.b1[:, None]
+    b2 = self.b2[:, None]
+    a1 = self.a1[:, None]
+    a2 = self.a2[:, None]
+    phi = (np.sin(math.pi * f[None, :] * 2/(2*srate)))**2
+    num = (b0+b1+b2)**2 - \
+    4*(b0*b1 + 4*b0*b2 + \
+    b1*b2)*phi + 16*b0*b2*phi*phi
+    den = (1+a1+a2)**2 - 4*(a1 + 4*a2 + \
+    a1*a2)*phi + 16*a2*phi*phi
+    with np.errstate(divide='ignore', invalid='ignore'):
+      r = num / den
+    r[r < 0] = 0
+    # same as Biquad.result, which fails with ZeroDivisionError on a zero denominator
+    r[den == 0] = np.nan
+    return r**(.5)
+
+  # provide static log results of every filter for a frequency array f, shape (filters, len(f))
+  def log_results(self, f):
+    r = self.results(f)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      lr = 20 * np.log10(r)
+    # same floor as Biquad.log_result for zero or undefined magnitudes
+    lr[(r == 0) | np.isnan(r)] = -200
+    return lr
+
+  # provide the combined static log result of the filter chain for a frequency array f,
+  # optionally together with the log results of the single filters
+  def log_result(self, f, per_filter=False):
+    lr = self.log_results(f)
+    total = np.zeros(lr.shape[1])
+    for row in lr:
+      total += row
+    if per_filter:
+      return total, lr
+    return total
+
+  # provide complex frequency responses of every filter for a frequency array f, shape (filters, len(f)).
+  # 20*log10 of the magnitude matches log_results.
+  def complex_results(self, f):
+    f = np.asarray(f, dtype=np.float64)
+    z = np.exp(-2j * math.pi * f[None, :] / self.srate[:, None])
+    num = self.b0[:, None] + (self.b1[:, None] + self.b2[:, None] * z) * z
+    den = 1 + (self.a1[:, None] + self.a2[:, None] * z) * z
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return num / den
+
+  # provide the complex frequency response of the filter chain for a frequency array f,
+  # optionally together with the responses of the single filters
+  def complex_result(self, f, per_filter=False):
+    h = self.complex_results(f)
+    total = np.prod(h, axis=0) if len(self) > 0 else np.ones(len(np.atleast_1d(f)), dtype=np.complex128)
+    if per_filter:
+      return total, h
+    return total
+
+  # provide the phases in radians of every filter for an ascending frequency array f, unwrapped along f
+  def phases(self, f):
+    return np.unwrap(np.angle(self.complex_results(f)), axis=1)
+
+  # provide the phase in radians of the filter chain for an ascending frequency array f
+  def phase(self, f):
+    return np.sum(self.phases(f), axis=0)
+
+  # provide the group delays in seconds of every filter for a frequency array f, shape (filters, len(f))
+  def group_delays(self, f):
+    f = np.asarray(f, dtype=np.float64)
+    z = np.exp(-2j * math.pi * f[None, :] / self.srate[:, None])
+    b0 = self.b0[:, None]
+    b1 = self.b1[:, None]
+    b2 = self.b2[:, None]
+    a1 = self.a1[:, None]
+    a2 = self.a2[:, None]
+    # -d(phase)/d(omega) of numerator and denominator polynomials in z = e^(-j omega), in samples
+    with np.errstate(divide='ignore', invalid='ignore'):
+      samples = np.real((b1*z + 2*b2*z*z) / (b0 + b1*z + b2*z*z)) - np.real((a1*z + 2*a2*z*z) / (1 + a1*z + a2*z*z))
+    return samples / self.srate[:, None]
+
+  # provide the group delay in seconds of the filter chain for a frequency array f
+  def group_delay(self, f):
+    return np.sum(self.group_delays(f), axis=0)
+
+  # provide the gradients of the static log results of every filter with respect to the prescaled constants
+  # a1, a2, b0, b1, b2 (order of constants()) for a frequency array f, shape (filters, 5, len(f))
+  def log_gradients(self, f):
+    f = np.asarray(f, dtype=np.float64)
+    b0 = self.b0[:, None]
+    b1 = self.b1[:, None]
+    b2 = self.b2[:, None]
+    a1 = self.a1[:, None]
+    a2 = self.a2[:, None]
+    phi = (np.sin(math.pi * f[None, :] * 2/(2*self.srate[:, None])))**2
+    sb = b0+b1+b2
+    sa = 1+a1+a2
+    num = sb**2 - 4*(b0*b1 + 4*b0*b2 + b1*b2)*phi + 16*b0*b2*phi*phi
+    den = sa**2 - 4*(a1 + 4*a2 + a1*a2)*phi + 16*a2*phi*phi
+    # log result is 10*log10(num/den)
+    scale = 10 / math.log(10)
+    grad = np.zeros((len(self), 5, len(f)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+      grad[:, 0] = -scale * (2*sa - 4*(1 + a2)*phi) / den
+      grad[:, 1] = -scale * (2*sa - 4*(4 + a1)*phi + 16*phi*phi) / den
+      grad[:, 2] = scale * (2*sb - 4*(b1 + 4*b2)*phi + 16*b2*phi*phi) / num
+      grad[:, 3] = scale * (2*sb - 4*(b0 + b2)*phi) / num
+      grad[:, 4] = scale * (2*sb - 4*(4*b0 + b1)*phi + 16*b0*phi*phi) / num
+    # same floor as log_results, the floor doesn't change with the constants
+    grad[~np.isfinite(grad)] = 0
+    grad[np.broadcast_to(((num <= 0) | (den <= 0))[:, None, :], grad.shape)] = 0
+    return grad
+
+  # provide the filter chain as second-order sections, shape (filters, 6), as used by scipy.signal.sosfilt
+  def sos(self):
+    return np.column_stack((self.b0, self.b1, self.b2, np.ones(len(self)), self.a1, self.a2))
+
+
+# filter blocks of samples by a chain of biquads at once, same result as calling every Biquad per sample.
+# The filter state is kept between blocks, so long signals can be filtered block by block.
+class BiquadFilter:
+
+  def __init__(self, biquads, channels=1):
+    bank = biquads if isinstance(biquads, BiquadBank) else BiquadBank(biquads)
+    if len(set(bank.srate)) > 1:
+      raise ValueError('all filters of a chain need the same sampling rate')
+    self.srate = float(bank.srate[0]) if len(bank) > 0 else 0
+    self.sections = bank.sos()
+    self.channels = channels
+    self.reset()
+
+  # clear filter state
+  def reset(self):
+    self.zi = np.zeros((len(self.sections), 2) + ((self.channels,) if self.channels > 1 else ()))
+
+  # filter block of samples, shape (n,) for a single channel or (n, channels), returns float64 samples
+  def __call__(self, x):
+    x = np.asarray(x, dtype=np.float64)
+    if len(self.sections) == 0:
+      return x.copy()
+    y, self.zi = sosfilt(self.sections, x, axis=0, zi=self.zi)
+    return y
+
+  # provide impulse response of n samples, the filter state is not changed
+  def impulse_response(self, n):
+    x = np.zeros(n)
+    x[0] = 1
+    if len(self.sections) == 0:
+      return x
+    return sosfilt(self.sections, x)
@@ -0,0 +1,125 @@
+import contextlib
+import io
+import numpy as np
+import bq.biquad as bq
+import frg.audio as audio
+import frg.batch as batch
+import frg.csvdata as csvdata
+import frg.curves as curves
+import frg.graph as graph
+import frg.impedance as impedance
+import frg.smoothing as smoothing
+
+# Importable interface of FreqRespGraph for other programs, e.g.
+#   import frg.api as api
+#   x, y = api.loadCurve('Sennheiser HD 650.csv')
+#   x, y = api.smooth(*api.align(x, y, 200, 2000), 1/12)
+#   png = api.render({'files': ['Sennheiser HD 650.csv'], 'alignmin': 200, 'alignmax': 2000})
+# Curves are numpy arrays of frequencies and values. Parsed CSV files stay in the memory cache of the process, so
+# programs rendering many graphs only pay for parsing once.
+
+# Image formats of render() and their MIME types
+IMAGE_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf', 'jpg': 'image/jpeg'}
+
+
+# Frequencies and values of a CSV file as read-only arrays, they are shared with later loads of the same file.
+# Use np.array(y) for a copy that can be changed.
+def loadCurve(filename, csv_delimiter=',', cachedir=csvdata.DEFAULT_CACHE_DIR, decimate=None):
+    x, y = csvdata.loadCurve(filename, csv_delimiter, cachedir, decimate)
+    return np.asarray(x), np.asarray(y)
+
+
+# Reference curve for compensate(), prepare it once if many curves are compensated
+def refCurve(x, y):
+    return curves.RefCurve(x, y)
+
+
+# Curve compensated by reference curve, ref is a refCurve() or a tuple of frequencies and values
+def compensate(x, y, ref):
+    if not isinstance(ref, curves.RefCurve):
+        ref = curves.RefCurve(*ref)
+    return curves.compensateCurve(x, y, ref)
+
+
+# Curve aligned to 0 dB at alignmin or within alignmin...alignmax, weighting 'points' or 'log'
+def align(x, y, alignmin, alignmax=-1, weighting='points'):
+    y = np.asarray(y, dtype=np.float64)
+    return x, y - curves.alignOffset(np.asarray(x, dtype=np.float64), y, alignmin, alignmax, weighting)
+
+
+# Curve smoothed by given octave fraction, a number or a string like '1/12'
+def smooth(x, y, fraction):
+    if isinstance(fraction, str):
+        fraction = parseValue(graph.parseSmooth, fraction)
+    return smoothing.smoothCurve(x, y, fraction)
+
+
+# PEQ filter bank of filters given in --peq format, e.g. ['PEAK,1000,1,-6', 'LOWSHELF,40,1,6']
+def peqFilters(peq, fpeq=48000):
+    return parseValue(graph.parsePeq, peq, fpeq)
+
+
+# Curve equalized by PEQ filters, peq is a peqFilters() filter bank or a list of filters in --peq format
+def equalize(x, y, peq, fpeq=48000):
+    if isinstance(peq, (list, tuple)):
+        peq = peqFilters(peq, fpeq)
+    if peq is None:
+        return x, y
+    return x, np.asarray(y, dtype=np.float64) + peq.log_result(x)
+
+
+# Audio samples filtered by PEQ filters designed for sampling rate srate, shape (n,) or (n, channels). Pass a
+# bq.BiquadFilter instead of filters to filter a long signal block by block.
+def filterAudio(samples, peq, srate=48000):
+    if isinstance(peq, bq.BiquadFilter):
+        return peq(samples)
+    if isinstance(peq, (list, tuple)):
+        peq = peqFilters(peq, srate)
+    if peq is None:
+        return np.asarray(samples, dtype=np.float64)
+    samples = np.asarray(samples)
+    return bq.BiquadFilter(audio.resampleFilters(peq, srate), 1 if samples.ndim == 1 else samples.shape[1])(samples)
+
+
+# Curves changed by the amplifier source resistance(s) driving impedance curve zx, z. Returns one curve per resistance.
+def impedanceEq(x, y, zx, z, resistances):
+    return impedance.ImpedanceEq(zx, z, resistances).apply(x, y)
+
+
+# Call function of the command line interface, errors are raised as ValueError with the printed error message
+# instead of exiting
+def parseValue(function, *values):
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            result = function(*values)
+    except SystemExit:
+        raise ValueError(output.getvalue().strip())
+    print( output.getvalue(), end='')
+    return result
+
+
+# Graph settings of a job as used in job files (command line options without leading '--', e.g. {'alignmin': 200,
+# 'files': ['a.csv']}) or a list of command line arguments. Raises ValueError for invalid settings.
+def parseJob(job):
+    if isinstance(job, dict):
+        return parseValue(batch.parseJob, job)
+    return parseValue(graph.createParser().parse_args, list(job))
+
+
+# Render graph into the figure of this process and return the figure. The figure is reused by the next call.
+def renderFigure(job):
+    args = parseJob(job)
+    if len(graph.selectFiles(args)) == 0:
+        raise ValueError('No files found')
+    return parseValue(batch.renderArgs, args)
+
+
+# Render graph into image data of given format (see IMAGE_FORMATS)
+def render(job, fmt='png', dpi='figure'):
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError('Unsupported image format: ' + fmt)
+    fig = renderFigure(job)
+    image = io.BytesIO()
+    fig.savefig(image, format=fmt, dpi=dpi, bbox_inches=None if batch.renderer.args.nolegend else 'tight')
+    return image.getvalue()
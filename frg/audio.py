@@ -0,0 +1,57 @@
+import numpy as np
+from scipy.io import wavfile
+import bq.biquad as bq
+
+# Time domain PEQ processing: audio files and impulse responses are filtered block by block by the PEQ filter chain
+# as second-order sections (bq.BiquadFilter), the filter state is carried from block to block.
+
+# Samples filtered at once
+BLOCK_SIZE = 1 << 16
+
+# Length of the impulse response used to measure the PEQ, gives a frequency resolution of about 0.7 Hz at 48 kHz
+VERIFY_LENGTH = 1 << 16
+
+
+# PEQ filter bank redesigned for sampling rate srate
+def resampleFilters(peq, srate):
+    return bq.BiquadBank([bq.Biquad(b.typ, b.freq, srate, b.Q, b.dbGain) for b in peq.biquads])
+
+
+# Frequency response of the PEQ measured from its impulse response by FFT, returns frequencies without 0 Hz and dB
+def measuredResponse(peq, n=VERIFY_LENGTH):
+    response = bq.BiquadFilter(peq).impulse_response(n)
+    f = np.fft.rfftfreq(n, 1 / float(peq.srate[0]))
+    with np.errstate(divide='ignore'):
+        db = 20 * np.log10(np.abs(np.fft.rfft(response)))
+    return f[1:], np.maximum(db[1:], -200)
+
+
+# Filter WAV file infile by PEQ filter bank and write the result to outfile in the same sample format. The filters
+# are designed for the sampling rate of the file. Integer samples exceeding the sample format are clipped, returns
+# the number of clipped samples.
+def filterWav(infile, outfile, peq, blocksize=BLOCK_SIZE):
+    try:
+        # Memory-map the input file if its format allows it (not 24 bit)
+        srate, data = wavfile.read(infile, mmap=True)
+    except ValueError:
+        srate, data = wavfile.read(infile)
+    if float(peq.srate[0]) != srate:
+        print( 'PEQ filters designed for ', srate, ' Hz sampling rate of ', infile)
+        peq = resampleFilters(peq, srate)
+    channels = 1 if data.ndim == 1 else data.shape[1]
+    chain = bq.BiquadFilter(peq, channels)
+    output = np.empty(data.shape, dtype=data.dtype)
+    clipped = 0
+    if np.issubdtype(data.dtype, np.integer):
+        limits = np.iinfo(data.dtype)
+    # 8 bit samples are unsigned with silence at 128
+    offset = 128 if data.dtype == np.uint8 else 0
+    for start in range(0, len(data), blocksize):
+        block = chain(data[start:start + blocksize].astype(np.float64) - offset) + offset
+        if np.issubdtype(data.dtype, np.integer):
+            block = np.rint(block)
+            clipped += int(np.count_nonzero((block < limits.min) | (block > limits.max)))
+            block = np.clip(block, limits.min, limits.max)
+        output[start:start + blocksize] = block
+    wavfile.write(outfile, srate, output)
+    return clipped
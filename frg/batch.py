@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import frg.graph as graph
+import frg.profiling as profiling
+
+# Job file settings which are not command line options
+JOB_SETTINGS = ('output', 'dpi')
+
+
+# Load job file in JSON or YAML format (YAML requires PyYAML). A job file contains a list of graphs or a dictionary
+# with the list of graphs in 'jobs' and settings shared by all graphs in 'defaults'. Each graph uses the command line
+# options without leading '--' as keys, e.g. "alignmin": 200 or "files": ["a.csv", "b.csv"], and the image file
+# name as 'output'. The image format is given by its extension, e.g. png, svg or jpg.
+def loadJobs(filename):
+    with open(filename, encoding='utf-8') as f:
+        if os.path.splitext(filename)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                print( 'Reading YAML job files requires PyYAML, install it using: pip install pyyaml')
+                sys.exit(1)
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, list):
+        defaults = {}
+        jobs = data
+    else:
+        defaults = data.get('defaults', {})
+        jobs = data.get('jobs', [])
+    return [dict(defaults, **job) for job in jobs]
+
+
+# Convert job settings to command line arguments
+def jobArguments(job):
+    argv = []
+    for key, value in job.items():
+        if key in JOB_SETTINGS or value is False or value is None:
+            continue
+        option = '--' + key
+        if value is True:
+            argv.append(option)
+        elif isinstance(value, list):
+            argv.append(option)
+            argv.extend(str(v) for v in value)
+        else:
+            argv.append(option + '=' + str(value))
+    return argv
+
+
+# Graph of the current process, its figure is reused for all rendered jobs
+renderer = None
+parser = None
+
+
+# Parse job settings into command line arguments, exits if they are invalid
+def parseJob(job):
+    global parser
+    if parser is None:
+        parser = graph.createParser()
+    return parser.parse_args(jobArguments(job))
+
+
+# Render graph of given command line arguments into the figure of this process and return the figure
+def renderArgs(args):
+    global renderer
+    if renderer is None:
+        fig = Figure(figsize = (9, 6))
+        FigureCanvasAgg(fig)
+        renderer = graph.Graph(fig)
+    renderer.render(args)
+    return renderer.fig
+
+
+# Render graph of given job into its output file, returns output file name or None if the job was skipped
+def renderJob(job):
+    output = job.get('output', '')
+    if output == '':
+        print( 'Job without output file skipped: ', job)
+        return None
+    try:
+        args = parseJob(job)
+        if len(graph.selectFiles(args)) == 0:
+            print( 'No files found, skipped: ', output)
+            return None
+        fig = renderArgs(args)
+        with profiling.stage('save', output):
+            fig.savefig(output, dpi=job.get('dpi', 'figure'), bbox_inches=None if args.nolegend else 'tight')
+    except SystemExit:
+        print( 'Invalid job skipped: ', output)
+        return None
+    print( 'Rendered: ', output)
+    return output
+
+
+# Render job in worker process, returns output file name and profiling records
+def renderWorker(job):
+    return renderJob(job), profiling.takeRecords()
+
+
+# Render all jobs, in parallel using jobs worker processes if jobs > 1 (0 = number of CPU cores)
+def runJobs(jobs, nworkers=1):
+    if nworkers == 0:
+        nworkers = os.cpu_count() or 1
+    nworkers = min(nworkers, len(jobs))
+    if nworkers <= 1:
+        return [renderJob(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=nworkers, initializer=profiling.initWorker, initargs=(profiling.enabled(), profiling.traceMemory)) as pool:
+        results = list(pool.map(renderWorker, jobs))
+    for output, records in results:
+        profiling.addRecords(records)
+    return [output for output, records in results]
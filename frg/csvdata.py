@@ -0,0 +1,313 @@
+import collections
+import csv
+import hashlib
+import io
+import json
+import os
+import numpy as np
+
+# Bump if the layout of the cached arrays changes
+CACHE_VERSION = 1
+
+# Default location of the parsed curve cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'FreqRespGraph')
+
+# Bytes of parsed curves kept in a cache directory. Files of changed CSV files are never used again, so the least
+# recently used files are removed above this size.
+CACHE_SIZE = 512 * 1024 * 1024
+
+# Cache directories pruned by this process, each is pruned once when the first curve is added to it
+prunedDirs = set()
+
+# Parsed curves kept in memory, shared by all graphs rendered by a process
+MEMORY_CACHE_SIZE = 1024
+memoryCache = collections.OrderedDict()
+
+# Decimation of large files while reading: 'mean' or 'power' average or 'minmax' per logarithmic frequency bin
+DECIMATE_MODES = ('mean', 'minmax', 'power')
+DEFAULT_BINS_PER_OCTAVE = 96
+
+# Size of text blocks read at once by the streaming reader
+STREAM_BLOCK_SIZE = 1 << 22
+
+
+# Parse a single CSV row, returns frequency and value or None if the row is not numeric
+def parseRow(row):
+    try:
+        return float(row[0]), float(row[1])
+    except (ValueError, IndexError):
+        return None
+
+
+# Row by row parser, used if the fast parser rejects a file (e.g. non-numeric rows in between data rows)
+def parseRows(text, csv_delimiter=','):
+    x = []
+    y = []
+    ignored = []
+    for row in csv.reader(io.StringIO(text, newline=''), delimiter=csv_delimiter):
+        if len(row) == 0:
+            continue
+        xy = parseRow(row)
+        if xy is None:
+            ignored.append(row)
+            continue
+        x.append(xy[0])
+        y.append(xy[1])
+    return np.array([x, y], dtype=np.float64).reshape(2, -1), ignored
+
+
+# Parse CSV text into a contiguous (2, n) float64 array of frequencies and values and the list of ignored
+# non-numeric rows. Header rows are skipped, the remaining rows are converted in a single pass by numpy.
+def parseCurve(text, csv_delimiter=','):
+    ignored = []
+    pos = 0
+    while pos < len(text):
+        end = text.find('\n', pos)
+        if end < 0:
+            end = len(text)
+        line = text[pos:end].rstrip('\r')
+        row = next(csv.reader([line], delimiter=csv_delimiter), [])
+        if len(row) > 0 and parseRow(row) is not None:
+            break
+        if len(row) > 0:
+            ignored.append(row)
+        pos = end + 1
+    body = text[pos:]
+    if body.strip() == '':
+        return np.empty((2, 0), dtype=np.float64), ignored
+    try:
+        data = np.loadtxt(io.StringIO(body), delimiter=csv_delimiter, usecols=(0, 1), comments=None, ndmin=2, unpack=True)
+    except ValueError:
+        return parseRows(text, csv_delimiter)
+    return np.ascontiguousarray(data, dtype=np.float64), ignored
+
+
+# Per bin statistics of all points of a curve, bins have 1/bins_per_octave octave width. Memory only depends on the
+# frequency range, not on the number of points.
+class BinAccumulator:
+
+    def __init__(self, bins_per_octave=DEFAULT_BINS_PER_OCTAVE):
+        self.bins_per_octave = bins_per_octave
+        # Bin number of first array entry
+        self.first = 0
+        self.count = np.zeros(0)
+        self.sumlogx = np.zeros(0)
+        self.sumy = np.zeros(0)
+        self.sumpower = np.zeros(0)
+        self.minx = np.zeros(0)
+        self.miny = np.zeros(0)
+        self.maxx = np.zeros(0)
+        self.maxy = np.zeros(0)
+
+    # Extend arrays to cover bins first...last
+    def extend(self, first, last):
+        if len(self.count) > 0:
+            first = min(first, self.first)
+            last = max(last, self.first + len(self.count) - 1)
+        n = last - first + 1
+        pos = self.first - first
+        for name, value in (('count', 0), ('sumlogx', 0), ('sumy', 0), ('sumpower', 0), ('minx', np.nan), ('miny', np.inf), ('maxx', np.nan), ('maxy', -np.inf)):
+            array = np.full(n, value, dtype=np.float64)
+            old = getattr(self, name)
+            array[pos:pos + len(old)] = old
+            setattr(self, name, array)
+        self.first = first
+
+    # Add points, points at frequencies <= 0 can't be shown on a logarithmic axis and are skipped
+    def add(self, x, y):
+        keep = x > 0
+        x = x[keep]
+        y = y[keep]
+        if len(x) == 0:
+            return
+        logx = np.log2(x)
+        bins = np.floor(logx * self.bins_per_octave).astype(np.int64)
+        self.extend(int(bins.min()), int(bins.max()))
+        bins = bins - self.first
+        n = len(self.count)
+        self.count += np.bincount(bins, minlength=n)
+        self.sumlogx += np.bincount(bins, logx, minlength=n)
+        self.sumy += np.bincount(bins, y, minlength=n)
+        self.sumpower += np.bincount(bins, np.power(10.0, y / 10), minlength=n)
+        # Minimum and maximum point of each bin of this block
+        order = np.lexsort((y, bins))
+        sortedbins = bins[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sortedbins[1:] != sortedbins[:-1]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = first[1:]
+        lo = order[first]
+        hi = order[last]
+        smaller = y[lo] < self.miny[bins[lo]]
+        self.miny[bins[lo[smaller]]] = y[lo[smaller]]
+        self.minx[bins[lo[smaller]]] = x[lo[smaller]]
+        larger = y[hi] > self.maxy[bins[hi]]
+        self.maxy[bins[hi[larger]]] = y[hi[larger]]
+        self.maxx[bins[hi[larger]]] = x[hi[larger]]
+
+    # Decimated curve as (2, n) array: per bin mean of values or power average at the geometric mean frequency,
+    # or minimum and maximum point in frequency order
+    def result(self, mode='mean'):
+        used = self.count > 0
+        count = self.count[used]
+        if mode == 'minmax':
+            x = np.column_stack((self.minx[used], self.maxx[used]))
+            y = np.column_stack((self.miny[used], self.maxy[used]))
+            swap = x[:, 0] > x[:, 1]
+            x[swap] = x[swap][:, ::-1]
+            y[swap] = y[swap][:, ::-1]
+            single = x[:, 0] == x[:, 1]
+            keep = np.column_stack((np.ones(len(x), dtype=bool), ~single))
+            return np.array([x[keep], y[keep]])
+        x = np.power(2.0, self.sumlogx[used] / count)
+        if mode == 'power':
+            y = 10 * np.log10(self.sumpower[used] / count)
+        else:
+            y = self.sumy[used] / count
+        return np.array([x, y])
+
+
+# Read CSV file block by block and decimate it into logarithmic frequency bins while reading, so memory doesn't
+# depend on the file size. Returns (2, n) array and ignored rows like parseCurve().
+def streamCurve(filename, csv_delimiter=',', mode='mean', bins_per_octave=DEFAULT_BINS_PER_OCTAVE):
+    bins = BinAccumulator(bins_per_octave)
+    ignored = []
+    with open(filename, newline='') as csvfile:
+        rest = ''
+        while True:
+            block = csvfile.read(STREAM_BLOCK_SIZE)
+            if block == '':
+                text = rest
+            else:
+                # Parse complete lines only, the last partial line is parsed with the next block
+                end = block.rfind('\n') + 1
+                if end == 0:
+                    rest = rest + block
+                    continue
+                text = rest + block[:end]
+                rest = block[end:]
+            data, blockignored = parseCurve(text, csv_delimiter)
+            ignored.extend(blockignored)
+            bins.add(data[0], data[1])
+            if block == '':
+                break
+    return np.ascontiguousarray(bins.result(mode)), ignored
+
+
+# Report rows skipped while parsing
+def reportIgnored(ignored, filename):
+    for row in ignored:
+        print( 'Ignoring: ', row, 'in ' , filename)
+
+
+# Cache file name for a CSV file, keyed by path, modification time, size, delimiter and decimation
+def cacheKey(filename, csv_delimiter, st, decimate=None):
+    key = '%d|%s|%d|%d|%s' % (CACHE_VERSION, os.path.abspath(filename), st.st_mtime_ns, st.st_size, csv_delimiter)
+    if decimate is not None:
+        key = key + '|%s|%d' % decimate
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+# Write cache file atomically so parallel runs never see partial files
+def writeCache(cachefile, data, ignored):
+    tmpfile = cachefile + '.%d.tmp' % os.getpid()
+    with open(tmpfile, 'wb') as f:
+        np.save(f, data)
+    if len(ignored) > 0:
+        with open(cachefile + '.ignored', 'w') as f:
+            json.dump(ignored, f)
+    os.replace(tmpfile, cachefile)
+
+
+# Read frequency/value pairs of a CSV file into float64 arrays. Parsed curves are stored in a memory-mappable
+# cache in cachedir, so unchanged files are not parsed again. Use cachedir=None to disable the cache. Curves read
+# before by the same process are taken from memory. decimate=(mode, bins per octave) streams the file and reduces
+# it to logarithmic frequency bins, see DECIMATE_MODES. The returned arrays are shared by all reads of the file and
+# read-only on every path (memory-mapped cache file, parsed or streamed file).
+def loadCurve(filename, csv_delimiter=',', cachedir=DEFAULT_CACHE_DIR, decimate=None):
+    st = os.stat(filename)
+    key = cacheKey(filename, csv_delimiter, st, decimate)
+    if key in memoryCache:
+        memoryCache.move_to_end(key)
+        data, ignored = memoryCache[key]
+        reportIgnored(ignored, filename)
+        return data[0], data[1]
+    data, ignored = readCurve(filename, csv_delimiter, cachedir, key, decimate)
+    data.setflags(write=False)
+    memoryCache[key] = (data, ignored)
+    if len(memoryCache) > MEMORY_CACHE_SIZE:
+        memoryCache.popitem(last=False)
+    return data[0], data[1]
+
+
+# Read curve from cache file or parse CSV file, returns (2, n) array and ignored rows
+def readCurve(filename, csv_delimiter, cachedir, key, decimate=None):
+    cachefile = None
+    if cachedir:
+        cachefile = os.path.join(cachedir, key + '.npy')
+        try:
+            data = np.load(cachefile, mmap_mode='r')
+            ignored = []
+            if os.path.exists(cachefile + '.ignored'):
+                with open(cachefile + '.ignored') as f:
+                    ignored = json.load(f)
+            reportIgnored(ignored, filename)
+            return data, ignored
+        except (OSError, ValueError):
+            pass
+    if decimate is not None:
+        data, ignored = streamCurve(filename, csv_delimiter, decimate[0], decimate[1])
+    else:
+        with open(filename, newline='') as csvfile:
+            text = csvfile.read()
+        data, ignored = parseCurve(text, csv_delimiter)
+    reportIgnored(ignored, filename)
+    if cachefile is not None:
+        try:
+            os.makedirs(cachedir, exist_ok=True)
+            writeCache(cachefile, data, ignored)
+        except OSError:
+            pass
+        if cachedir not in prunedDirs:
+            prunedDirs.add(cachedir)
+            pruneCache(cachedir)
+    return data, ignored
+
+
+# Remove least recently used (by access or modification time) parsed curves from cachedir until the cache files
+# take at most maxbytes, maxbytes=0 clears the cache. Other files and subdirectories (e.g. the measurement index) are
+# kept. Returns the number of removed curves.
+def pruneCache(cachedir, maxbytes=CACHE_SIZE):
+    entries = {}
+    try:
+        scan = os.scandir(cachedir)
+    except OSError:
+        return 0
+    with scan:
+        for entry in scan:
+            key = entry.name.split('.')[0]
+            if len(key) != 40 or entry.name not in (key + '.npy', key + '.npy.ignored'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            used, size, paths = entries.get(key, (0, 0, []))
+            # Ignored rows are read together with the curve, files without curve are removed first
+            if entry.name == key + '.npy':
+                used = max(st.st_atime, st.st_mtime)
+            entries[key] = (used, size + st.st_size, paths + [entry.path])
+    total = sum(size for used, size, paths in entries.values())
+    removed = 0
+    for used, size, paths in sorted(entries.values()):
+        if total <= maxbytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                # Removed by another process or in use (Windows)
+                pass
+        total -= size
+        removed += 1
+    return removed
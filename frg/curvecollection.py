@@ -0,0 +1,168 @@
+import math
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.lines import Line2D
+
+
+# Select points of many curves to be drawn on a logarithmic frequency axis of npixels width. Every curve keeps its
+# minimum and maximum value per pixel column plus its first and last point, points outside of xmin...xmax are
+# reduced the same way into one column on each side. Curves are given as concatenated frequencies x and values y
+# with the index of the curve of each point. Returns a boolean mask of the points to be kept.
+def decimate(x, y, curve, xmin, xmax, npixels):
+    npixels = max(int(npixels), 1)
+    keep = np.zeros(len(x), dtype=bool)
+    if len(x) == 0:
+        return keep
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pos = (np.log(x) - math.log(xmin)) / (math.log(xmax) - math.log(xmin)) * npixels
+    column = np.floor(np.clip(np.nan_to_num(pos, nan=-1.0), -1, npixels)).astype(np.int64) + 1
+    key = curve * (npixels + 2) + column
+    order = np.lexsort((y, key))
+    sortedkey = key[order]
+    first = np.empty(len(x), dtype=bool)
+    first[0] = True
+    first[1:] = sortedkey[1:] != sortedkey[:-1]
+    last = np.empty(len(x), dtype=bool)
+    last[-1] = True
+    last[:-1] = first[1:]
+    keep[order[first]] = True
+    keep[order[last]] = True
+    # Keep curve start and end points
+    keep[0] = True
+    keep[-1] = True
+    change = np.flatnonzero(curve[1:] != curve[:-1])
+    keep[change] = True
+    keep[change + 1] = True
+    return keep
+
+
+# Many curves drawn by a single LineCollection, decimated to the resolution of the axes. The curves are redecimated
+# when the x axis limits or the figure size change. Curves moved up or down keep their decimated points, the minimum
+# and maximum per pixel column don't change.
+class CurveCollection:
+
+    def __init__(self, ax, traces, colors, lw=1.5):
+        self.ax = ax
+        self.data = [(t.x, t.y) for t in traces]
+        self.concatenate()
+        self.linewidths = np.full(len(traces), lw)
+        self.visible = np.ones(len(traces), dtype=bool)
+        self.zorder = np.full(len(traces), 2)
+        self.colors = to_rgba_array(colors)
+        self.segments = []
+        self.shifted = False
+        self.collection = LineCollection([], zorder=2)
+        ax.add_collection(self.collection, autolim=False)
+        ax.callbacks.connect('xlim_changed', self.on_change)
+        ax.figure.canvas.mpl_connect('resize_event', self.on_change)
+
+    def __len__(self):
+        return len(self.data)
+
+    # Concatenate curve data for vectorized decimation
+    def concatenate(self):
+        self.lengths = np.array([len(x) for x, y in self.data], dtype=np.int64)
+        self.starts = np.cumsum(self.lengths) - self.lengths
+        self.x = np.concatenate([x for x, y in self.data]) if len(self.data) > 0 else np.empty(0)
+        self.y = np.concatenate([y for x, y in self.data]) if len(self.data) > 0 else np.empty(0)
+        self.curve = np.repeat(np.arange(len(self.data)), self.lengths)
+        self.dirty = False
+
+    # Replace data of single curve, takes effect on next refresh()
+    def setCurveData(self, i, x, y):
+        self.data[i] = (np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+        self.dirty = True
+
+    # Move single curve by dy, takes effect on next refresh()
+    def shiftCurve(self, i, dy):
+        x, y = self.data[i]
+        self.data[i] = (x, y + dy)
+        if not self.dirty:
+            self.y[self.starts[i]:self.starts[i] + self.lengths[i]] += dy
+            if i < len(self.segments):
+                self.segments[i][:, 1] += dy
+        self.shifted = True
+
+    # Decimate again if curve data changed
+    def refresh(self):
+        if self.dirty:
+            self.concatenate()
+            self.decimate()
+        elif self.shifted:
+            self.update()
+        self.shifted = False
+
+    # Extend the data limits of the axes to all curve points, the collection is added with autolim=False
+    def updateDataLim(self):
+        finite = np.isfinite(self.x) & np.isfinite(self.y)
+        if finite.any():
+            x = self.x[finite]
+            y = self.y[finite]
+            self.ax.update_datalim([(x.min(), y.min()), (x.max(), y.max())])
+
+    # Line2D like handle of single curve
+    def curveHandle(self, i):
+        return CollectionCurve(self, i)
+
+    # Legend handle of single curve
+    def legendHandle(self, i, label):
+        return Line2D([], [], color=self.colors[i], lw=self.linewidths[i], label=label)
+
+    def on_change(self, *args):
+        self.decimate()
+
+    # Decimate curves for current x axis limits and axes width
+    def decimate(self):
+        xmin, xmax = self.ax.get_xlim()
+        npixels = self.ax.get_window_extent().width
+        if xmin <= 0 or xmax <= xmin or len(self.x) == 0:
+            keep = np.ones(len(self.x), dtype=bool)
+        else:
+            keep = decimate(self.x, self.y, self.curve, xmin, xmax, npixels)
+        points = np.column_stack((self.x[keep], self.y[keep]))
+        counts = np.bincount(self.curve[keep], minlength=len(self))
+        self.segments = np.split(points, np.cumsum(counts)[:-1])
+        self.update()
+
+    # Update line widths, visibility and drawing order of all curves, curves with higher zorder are drawn on top
+    def update(self):
+        order = np.lexsort((np.arange(len(self)), self.zorder))
+        colors = self.colors[order].copy()
+        colors[~self.visible[order], 3] = 0
+        self.collection.set_segments([self.segments[i] for i in order])
+        self.collection.set_linewidths(self.linewidths[order])
+        self.collection.set_color(colors)
+
+
+# Single curve of a CurveCollection, supports the Line2D methods used by the legend pick handler
+class CollectionCurve:
+
+    def __init__(self, collection, i):
+        self.collection = collection
+        self.i = i
+
+    def get_linewidth(self):
+        return self.collection.linewidths[self.i]
+
+    def set_linewidth(self, lw):
+        self.collection.linewidths[self.i] = lw
+        self.collection.update()
+
+    def get_visible(self):
+        return bool(self.collection.visible[self.i])
+
+    def set_visible(self, visible):
+        self.collection.visible[self.i] = visible
+        self.collection.update()
+
+    def set_data(self, x, y):
+        self.collection.setCurveData(self.i, x, y)
+
+    # Move curve up or down by dy
+    def shift(self, dy):
+        self.collection.shiftCurve(self.i, dy)
+
+    def set_zorder(self, zorder):
+        self.collection.zorder[self.i] = zorder
+        self.collection.update()
@@ -0,0 +1,263 @@
+import fnmatch
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import frg.csvdata as csvdata
+import frg.smoothing as smoothing
+
+# Measurement index: all curves of a measurement tree resampled onto one shared logarithmic frequency grid and stored
+# as rows of a single float32 matrix (curves.npy, memory-mapped when read), values outside of the frequency range of
+# a measurement are NaN. The metadata of all curves is stored column by column in index.json, one list per column.
+
+# Bump if the layout of the index changes, older indexes are rebuilt
+INDEX_VERSION = 2
+
+# Default location of the measurement index
+DEFAULT_INDEX_DIR = os.path.join(csvdata.DEFAULT_CACHE_DIR, 'index')
+
+# Shared frequency grid of all indexed curves
+GRID_FMIN = 20.0
+GRID_FMAX = 20000.0
+GRID_POINTS_PER_OCTAVE = 48
+
+# Metadata columns
+COLUMNS = ('path', 'source', 'type', 'vendor', 'model', 'points', 'fmin', 'fmax', 'mtime_ns', 'size', 'row')
+
+# Vendor names containing blanks, other vendors are taken from the first word of the model name
+MULTIWORD_VENDORS = ('Bang & Olufsen', 'Bowers & Wilkins', 'Campfire Audio', 'Dan Clark Audio', 'Final Audio')
+
+METADATA_FILE = 'index.json'
+MATRIX_FILE = 'curves.npy'
+
+
+# Shared frequency grid of the index
+def indexGrid():
+    return smoothing.logGrid(GRID_FMIN, GRID_FMAX, GRID_POINTS_PER_OCTAVE)
+
+
+# Source, form factor, vendor and model of a measurement file from its path relative to the measurement tree,
+# e.g. <source>/data/<type>/<model>.csv as used by AutoEq
+def parsePath(path, root):
+    parts = os.path.relpath(path, root).split(os.sep)
+    model = os.path.splitext(parts[-1])[0]
+    dirs = parts[:-1]
+    if 'data' in dirs:
+        i = len(dirs) - 1 - dirs[::-1].index('data')
+        source = dirs[i-1] if i > 0 else ''
+        typ = dirs[i+1] if i+1 < len(dirs) else ''
+    else:
+        source = dirs[0] if len(dirs) > 0 else ''
+        typ = dirs[-1] if len(dirs) > 1 else ''
+    vendor = model.split(' ')[0]
+    for v in MULTIWORD_VENDORS:
+        if model.startswith(v + ' '):
+            vendor = v
+    return source, typ, vendor, model
+
+
+# Index of measurement curves stored in directory indexdir
+class CurveIndex:
+
+    def __init__(self, indexdir):
+        self.indexdir = indexdir
+        self.grid = indexGrid()
+        self.columns = {c: [] for c in COLUMNS}
+        self.matrix = None
+        self.rows = {}
+        # Modification time and size of each file when it was indexed
+        self.stats = {}
+
+    def __len__(self):
+        return len(self.columns['path'])
+
+    # Read metadata and memory-map curve matrix, returns False if there is no valid index
+    def load(self, mode='r'):
+        try:
+            with open(os.path.join(self.indexdir, METADATA_FILE), encoding='utf-8') as f:
+                metadata = json.load(f)
+            if metadata.get('version') != INDEX_VERSION or metadata.get('grid') != [GRID_FMIN, GRID_FMAX, GRID_POINTS_PER_OCTAVE]:
+                return False
+            self.columns = {c: metadata['columns'][c] for c in COLUMNS}
+            self.matrix = np.load(os.path.join(self.indexdir, MATRIX_FILE), mmap_mode=mode)
+        except (OSError, ValueError, KeyError):
+            return False
+        self.rows = {path: row for path, row in zip(self.columns['path'], self.columns['row'])}
+        self.stats = {path: (mtime, size) for path, mtime, size in zip(self.columns['path'], self.columns['mtime_ns'], self.columns['size'])}
+        return True
+
+    # Matrix row of given measurement file, None if the file is not indexed or changed since indexing
+    def row(self, path):
+        path = os.path.abspath(path)
+        if path not in self.rows:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (st.st_mtime_ns, st.st_size) != tuple(self.stats[path]):
+            return None
+        return self.rows[path]
+
+    # Curve of given measurement file as float64 frequencies and values, None if the file is not indexed or changed
+    # since indexing
+    def curve(self, path):
+        row = self.row(path)
+        if row is None:
+            return None
+        y = np.asarray(self.matrix[row], dtype=np.float64)
+        valid = ~np.isnan(y)
+        return self.grid[valid], y[valid]
+
+    # Files matching all given criteria, each criterion is a list of case-insensitive wildcard patterns of which
+    # one has to match. Empty criteria match all files.
+    def select(self, vendors=[], models=[], sources=[], types=[]):
+        criteria = [(self.columns['vendor'], vendors), (self.columns['model'], models), (self.columns['source'], sources), (self.columns['type'], types)]
+        files = []
+        for i, path in enumerate(self.columns['path']):
+            if all(len(patterns) == 0 or any(fnmatch.fnmatchcase(values[i].lower(), p.lower()) for p in patterns) for values, patterns in criteria):
+                files.append(path)
+        return files
+
+    # Write metadata atomically, done after the matrix rows are written
+    def saveMetadata(self):
+        metadata = {'version': INDEX_VERSION, 'grid': [GRID_FMIN, GRID_FMAX, GRID_POINTS_PER_OCTAVE], 'columns': self.columns}
+        metadatafile = os.path.join(self.indexdir, METADATA_FILE)
+        tmpfile = metadatafile + '.%d.tmp' % os.getpid()
+        with open(tmpfile, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(tmpfile, metadatafile)
+
+    # Make sure the curve matrix has at least nrows rows, the matrix file is replaced by a larger copy if needed
+    def reserve(self, nrows):
+        if self.matrix is not None and len(self.matrix) >= nrows:
+            return
+        capacity = max(nrows, 2 * len(self.matrix) if self.matrix is not None else 0)
+        matrixfile = os.path.join(self.indexdir, MATRIX_FILE)
+        tmpfile = matrixfile + '.%d.tmp' % os.getpid()
+        if capacity == 0:
+            with open(tmpfile, 'wb') as f:
+                np.save(f, np.empty((0, len(self.grid)), dtype=np.float32))
+        else:
+            matrix = np.lib.format.open_memmap(tmpfile, mode='w+', dtype=np.float32, shape=(capacity, len(self.grid)))
+            matrix[:] = np.nan
+            if self.matrix is not None:
+                matrix[:len(self.matrix)] = self.matrix
+            matrix.flush()
+            del matrix
+        self.matrix = None
+        os.replace(tmpfile, matrixfile)
+        self.matrix = np.load(matrixfile, mmap_mode='r+')
+
+
+# Read measurement file and resample it onto the index grid, returns row, point count and frequency range or None
+# if the file can't be read
+def readIndexCurve(path, csv_delimiter=','):
+    try:
+        with open(path, newline='') as csvfile:
+            data, ignored = csvdata.parseCurve(csvfile.read(), csv_delimiter)
+    except (OSError, UnicodeDecodeError, ValueError):
+        return None
+    if data.shape[1] == 0:
+        return None
+    row = smoothing.resampleCurves([(data[0], data[1])], indexGrid())[0].astype(np.float32)
+    return row, data.shape[1], float(data[0][0]), float(data[0][-1])
+
+
+# Create or update the index in indexdir with all CSV files of the measurement tree root. Only new or changed files
+# (by modification time and size) are read, entries of deleted files are removed and their rows reused. Files are
+# read by jobs worker processes if jobs > 1 (0 = number of CPU cores). Returns the updated index.
+def buildIndex(root, indexdir=DEFAULT_INDEX_DIR, csv_delimiter=',', jobs=1):
+    os.makedirs(indexdir, exist_ok=True)
+    index = CurveIndex(indexdir)
+    if not index.load('r+'):
+        index = CurveIndex(indexdir)
+    root = os.path.abspath(root)
+
+    # Find new and changed files
+    found = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith('.csv'):
+                path = os.path.join(dirpath, filename)
+                st = os.stat(path)
+                found[path] = (st.st_mtime_ns, st.st_size)
+    entries = {path: {c: index.columns[c][i] for c in COLUMNS} for i, path in enumerate(index.columns['path'])}
+    changed = [path for path, stat in found.items() if path not in entries or (entries[path]['mtime_ns'], entries[path]['size']) != stat]
+    removed = [path for path in entries if path not in found and (path + os.sep).startswith(root + os.sep)]
+
+    # Changed files keep their row, new files reuse the rows of removed files first
+    free = sorted(entries.pop(path)['row'] for path in removed)
+    used = set(e['row'] for e in entries.values())
+    nextrow = max(used | set(free), default=-1) + 1
+    added = len([path for path in changed if path not in entries])
+    if added > 0:
+        index.reserve(nextrow + max(0, added - len(free)))
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(changed))
+    if jobs <= 1:
+        results = [readIndexCurve(path, csv_delimiter) for path in changed]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(readIndexCurve, changed, [csv_delimiter] * len(changed), chunksize=max(1, len(changed) // (4 * jobs))))
+
+    for path, result in zip(changed, results):
+        if result is None:
+            print( 'Ignoring unreadable file: ', path)
+            if path in entries:
+                free.append(entries.pop(path)['row'])
+            continue
+        if path in entries:
+            row = entries[path]['row']
+        elif len(free) > 0:
+            row = free.pop(0)
+        else:
+            row = nextrow
+            nextrow = nextrow + 1
+        index.reserve(row + 1)
+        index.matrix[row] = result[0]
+        source, typ, vendor, model = parsePath(path, root)
+        entries[path] = {'path': path, 'source': source, 'type': typ, 'vendor': vendor, 'model': model, 'points': result[1],
+                         'fmin': result[2], 'fmax': result[3], 'mtime_ns': found[path][0], 'size': found[path][1], 'row': row}
+    if index.matrix is not None:
+        index.matrix.flush()
+    else:
+        # No curves found, an empty matrix keeps the index readable
+        index.reserve(0)
+
+    index.columns = {c: [entries[path][c] for path in sorted(entries)] for c in COLUMNS}
+    index.rows = {path: entries[path]['row'] for path in entries}
+    index.stats = {path: (entries[path]['mtime_ns'], entries[path]['size']) for path in entries}
+    index.saveMetadata()
+    print( 'Indexed ', len(index), ' curves in ', indexdir, ' (', len(changed), ' read, ', len(removed), ' removed)')
+    return index
+
+
+# Indexes opened by this process
+openIndexes = {}
+
+
+# Open index in indexdir for reading, reopened if it was updated in the meantime. Returns None if there is no index.
+def openIndex(indexdir):
+    try:
+        mtime = os.stat(os.path.join(indexdir, METADATA_FILE)).st_mtime_ns
+    except OSError:
+        return None
+    if indexdir in openIndexes and openIndexes[indexdir][0] == mtime:
+        return openIndexes[indexdir][1]
+    index = CurveIndex(indexdir)
+    if not index.load():
+        return None
+    openIndexes[indexdir] = (mtime, index)
+    return index
+
+
+# Curve of given measurement file from index in indexdir, None if the file is not indexed
+def loadCurve(indexdir, path):
+    index = openIndex(indexdir)
+    if index is None:
+        return None
+    return index.curve(path)
@@ -0,0 +1,164 @@
+import numpy as np
+
+
+# Reference curve prepared once for compensating any number of curves
+class RefCurve:
+
+    def __init__(self, x, y):
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+        # Slopes of the linear interpolation between neighbouring reference points
+        if len(self.x) > 1:
+            self.slope = (self.y[1:] - self.y[:-1]) / (self.x[1:] - self.x[:-1])
+        else:
+            self.slope = np.empty(0)
+
+    def __len__(self):
+        return len(self.x)
+
+
+# Compensate curve according to reference curve. Points outside of the frequency range of the reference curve are
+# dropped, points between reference frequencies use linear interpolation of the reference curve.
+def compensateCurve(x, y, ref):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(ref)
+    if n == 0:
+        return x[:0], y[:0]
+    index = np.searchsorted(ref.x, x)
+    # Out of xrange of reference curve (value too big)
+    keep = index < n
+    match = np.minimum(index, n - 1)
+    exact = keep & (ref.x[match] == x)
+    # Out of xrange of reference curve (value too small) unless exact match
+    keep &= exact | (index > 0)
+    x = x[keep]
+    y = y[keep]
+    index = index[keep]
+    exact = exact[keep]
+    match = match[keep]
+    # Exact match in reference curve found => use its value, otherwise use linear interpolation of reference curve
+    yc = ref.y[match]
+    interp = ~exact
+    lower = index[interp] - 1
+    yc[interp] = (ref.slope[lower] * (x[interp] - ref.x[lower])) + ref.y[lower]
+    return x, y - yc
+
+
+# Weightings of alignment ranges: average of the data points or trapezoidal average over logarithmic frequency,
+# which weights every octave equally regardless of the point density of the curve
+ALIGN_WEIGHTINGS = ('points', 'log')
+
+
+# Offset to align curve to 0 dB at frequency alignmin (alignmax < 0, nearest data point) or to the average within
+# the frequency range alignmin...alignmax
+def alignOffset(x, y, alignmin, alignmax, weighting='points'):
+    if weighting != 'points':
+        return AlignIndex(x, y, weighting).offset(alignmin, alignmax)
+    if len(x) == 0:
+        return 0
+    if alignmax < 0:
+        # Align to frequency point
+        distance = np.fabs(x - alignmin)
+        i = np.argmin(distance)
+        if distance[i] < 1000000:
+            return y[i]
+        return 0
+    # Align to frequency range
+    inrange = (x > alignmin) & (x < alignmax)
+    count = np.count_nonzero(inrange)
+    offset = np.sum(y[inrange])
+    if alignmax > 0 and count > 0:
+        offset = offset / count
+    return offset
+
+
+# Cumulative sums of a curve, built once to answer the alignment offset of any frequency range by two binary searches
+# instead of summing all points again, e.g. while an alignment range is dragged in the interactive graph. 'points'
+# weighting gives the same offsets as alignOffset(), 'log' weighting interpolates linearly over log frequency and
+# integrates the curve by the trapezoidal rule.
+class AlignIndex:
+
+    def __init__(self, x, y, weighting='points'):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if weighting == 'log':
+            valid = x > 0
+            x = x[valid]
+            y = y[valid]
+        if len(x) > 1 and np.any(x[1:] < x[:-1]):
+            order = np.argsort(x, kind='stable')
+            x = x[order]
+            y = y[order]
+        self.weighting = weighting
+        self.x = x
+        self.y = y
+        if weighting == 'log':
+            self.logx = np.log(x)
+            width = np.diff(self.logx)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.slope = np.where(width > 0, np.diff(y) / width, 0)
+            # Integral over log frequency from the first point up to each point
+            self.area = np.concatenate(([0], np.cumsum(width * (y[1:] + y[:-1]) / 2)))
+        else:
+            # Sum of the first i points
+            self.csum = np.concatenate(([0], np.cumsum(y)))
+
+    def __len__(self):
+        return len(self.x)
+
+    def offset(self, alignmin, alignmax):
+        if len(self.x) == 0:
+            return 0
+        if self.weighting == 'log':
+            return self.logOffset(alignmin, alignmax)
+        if alignmax < 0:
+            # Nearest data point, the lower one if both neighbours are equally close
+            i = int(np.searchsorted(self.x, alignmin))
+            if i == len(self.x) or (i > 0 and alignmin - self.x[i-1] <= self.x[i] - alignmin):
+                i = i - 1
+            # First of duplicate frequencies
+            i = int(np.searchsorted(self.x, self.x[i]))
+            if abs(self.x[i] - alignmin) < 1000000:
+                return self.y[i]
+            return 0
+        lo = int(np.searchsorted(self.x, alignmin, 'right'))
+        hi = int(np.searchsorted(self.x, alignmax, 'left'))
+        if hi <= lo:
+            return 0
+        offset = self.csum[hi] - self.csum[lo]
+        if alignmax > 0:
+            offset = offset / (hi - lo)
+        return offset
+
+    # Curve value interpolated over log frequency at logf, clipped to the frequency range of the curve
+    def logValue(self, logf):
+        i = min(max(int(np.searchsorted(self.logx, logf, 'right')), 1), len(self.x) - 1)
+        return self.y[i-1] + self.slope[i-1] * (logf - self.logx[i-1])
+
+    # Integral over log frequency from the first point up to logf
+    def logArea(self, logf):
+        i = min(max(int(np.searchsorted(self.logx, logf, 'right')), 1), len(self.x) - 1)
+        u = logf - self.logx[i-1]
+        return self.area[i-1] + u * (self.y[i-1] + self.y[i-1] + self.slope[i-1] * u) / 2
+
+    # Value at frequency alignmin (alignmax < 0) or average over log frequency within alignmin...alignmax, limited to
+    # the frequency range of the curve
+    def logOffset(self, alignmin, alignmax):
+        first = self.logx[0]
+        last = self.logx[-1]
+        if alignmax < 0:
+            if alignmin <= 0:
+                return 0
+            if len(self.x) == 1:
+                return self.y[0]
+            return self.logValue(min(max(np.log(alignmin), first), last))
+        if alignmin >= alignmax or alignmax <= self.x[0] or alignmin >= self.x[-1]:
+            return 0
+        if len(self.x) == 1:
+            return self.y[0]
+        lo = max(np.log(alignmin), first) if alignmin > 0 else first
+        hi = min(np.log(alignmax), last)
+        if hi <= lo:
+            return self.logValue(lo)
+        return (self.logArea(hi) - self.logArea(lo)) / (hi - lo)
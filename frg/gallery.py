@@ -0,0 +1,171 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import frg.csvdata as csvdata
+import frg.memo as memo
+
+# Incremental rebuild of the images of a job file (e.g. examples/examples.json or headphonevendor/vendors.json). The
+# settings of each job, its file patterns and modification time, size and content hash of all files read by it are
+# kept in a state file per job file. A job is only rendered again if its settings, its input files (including files
+# added to or removed from its file patterns) or its image changed. Changed modification times of unchanged files don't
+# render again. Invalid jobs and jobs without files are recorded as well, so they are only tried again if they change.
+# Outdated jobs are checked against the recorded state without parsing them, matplotlib and the processing modules are
+# only imported if an image has to be rendered.
+
+# Bump if the images would change for the same settings and input files
+GALLERY_VERSION = 2
+
+DEFAULT_STATE_DIR = os.path.join(csvdata.DEFAULT_CACHE_DIR, 'gallery')
+
+
+# State file of a job file
+def stateFile(jobfile, statedir=DEFAULT_STATE_DIR):
+    return os.path.join(statedir, hashlib.sha1(os.path.abspath(jobfile).encode()).hexdigest() + '.json')
+
+
+def loadState(statefile):
+    try:
+        with open(statefile, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') == GALLERY_VERSION:
+            return state
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': GALLERY_VERSION, 'jobfile': None, 'jobs': {}}
+
+
+def saveState(statefile, state):
+    os.makedirs(os.path.dirname(statefile), exist_ok=True)
+    tmpfile = statefile + '.%d.tmp' % os.getpid()
+    with open(tmpfile, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmpfile, statefile)
+
+
+def settingsHash(job):
+    return hashlib.sha1(json.dumps(job, sort_keys=True).encode()).hexdigest()
+
+
+# File patterns of a job and all files read by it: plotted curves, reference and target curves, impedance curve and
+# the measurement index. Returns None if the job is invalid.
+def jobInputs(job):
+    # Imported here, a rebuild without outdated images doesn't need matplotlib
+    import frg.batch as batch
+    import frg.curvedb as curvedb
+    import frg.graph as graph
+    try:
+        args = batch.parseJob(job)
+        files = graph.selectFiles(args)
+    except SystemExit:
+        return None
+    files = files + [f for f in (args.refcurve, args.zeq_file, args.match) if f != '']
+    if graph.usesIndex(args):
+        files.append(os.path.join(args.index, curvedb.METADATA_FILE))
+    return args.files, sorted(set(os.path.abspath(f) for f in files))
+
+
+# Modification time and size of a file, None if it doesn't exist
+def fileStat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+# Modification time, size and content hash of a file, None if it doesn't exist
+def fileEntry(path):
+    stat = fileStat(path)
+    if stat is None:
+        return None
+    return stat + [memo.fileDigest(path)]
+
+
+# Check if a file changed since entry was recorded. Files with a changed modification time but unchanged contents are
+# updated in entry.
+def fileChanged(path, entry):
+    stat = fileStat(path)
+    if stat is None or entry is None:
+        return stat != entry
+    if stat == entry[:2]:
+        return False
+    if memo.fileDigest(path) != entry[2]:
+        return True
+    entry[:2] = stat
+    return False
+
+
+# State entry of a job, its image is added after rendering
+def jobEntry(job):
+    inputs = jobInputs(job)
+    patterns, files = inputs if inputs is not None else ([], [])
+    return {'settings': settingsHash(job), 'patterns': patterns, 'files': {path: fileEntry(path) for path in files}}
+
+
+# Check if the image of a recorded job has to be rendered again
+def isOutdated(output, entry):
+    if fileStat(output) != entry['output']:
+        return True
+    if any(fileChanged(path, fentry) for path, fentry in entry['files'].items()):
+        return True
+    return any(os.path.abspath(f) not in entry['files'] for pattern in entry['patterns'] for f in glob.glob(pattern))
+
+
+def printSummary(rendered, total, uptodate):
+    print( 'Rendered ', rendered, ' of ', total, ' images, ', uptodate, ' up to date')
+
+
+# Check if the job file is unchanged since the last run and all its images are up to date, using the state file only
+def upToDate(jobfile, statedir=DEFAULT_STATE_DIR):
+    statefile = stateFile(jobfile, statedir)
+    state = loadState(statefile)
+    if fileChanged(jobfile, state['jobfile']) or any(isOutdated(output, entry) for output, entry in state['jobs'].items()):
+        return False
+    saveState(statefile, state)
+    printSummary(0, len(state['jobs']), len(state['jobs']))
+    return True
+
+
+# Check if the command line is an incremental rebuild of a job file whose images are all up to date. Uses its own
+# parser, the command line parser of FreqRespGraph imports matplotlib and the processing modules.
+def upToDateCommand(argv):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('--jobfile', nargs='?', default='')
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--jobs', nargs='?')
+    args, unknown = parser.parse_known_args(argv)
+    return len(unknown) == 0 and args.incremental and bool(args.jobfile) and upToDate(args.jobfile)
+
+
+# Render the outdated images of the job file, in parallel using nworkers worker processes if nworkers > 1 (0 = number
+# of CPU cores). Returns the list of rendered images.
+def buildGallery(jobfile, nworkers=1, statedir=DEFAULT_STATE_DIR):
+    import frg.batch as batch
+    statefile = stateFile(jobfile, statedir)
+    state = loadState(statefile)
+    jobs = []
+    for job in batch.loadJobs(jobfile):
+        if job.get('output', '') == '':
+            print( 'Job without output file skipped: ', job)
+        else:
+            jobs.append(job)
+    entries = {}
+    outdated = []
+    for job in jobs:
+        output = job['output']
+        entry = state['jobs'].get(output)
+        if entry is None or entry['settings'] != settingsHash(job) or isOutdated(output, entry):
+            outdated.append(job)
+            entries[output] = jobEntry(job)
+        else:
+            entries[output] = entry
+    rendered = [output for output in batch.runJobs(outdated, nworkers) if output is not None] if len(outdated) > 0 else []
+    # Skipped jobs are recorded too, with the image they left in place
+    for job in outdated:
+        entries[job['output']]['output'] = fileStat(job['output'])
+    # Jobs removed from the job file are forgotten
+    saveState(statefile, {'version': GALLERY_VERSION, 'jobfile': fileEntry(jobfile), 'jobs': entries})
+    printSummary(len(rendered), len(jobs), len(jobs) - len(outdated))
+    return rendered
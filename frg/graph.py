@@ -0,0 +1,429 @@
+import argparse
+import copy
+import glob
+import os
+import sys
+import numpy as np
+import matplotlib
+from matplotlib.ticker import FuncFormatter
+from matplotlib.ticker import LogFormatter
+import bq.biquad as bq
+import frg.audio as audio
+import frg.csvdata as csvdata
+import frg.curvecollection as curvecollection
+import frg.curvedb as curvedb
+import frg.curves as curves
+import frg.impedance as impedance
+import frg.memo as memo
+import frg.peqfit as peqfit
+import frg.phase as phase
+import frg.pipeline as pipeline
+import frg.profiling as profiling
+import frg.search as search
+import frg.smoothing as smoothing
+import frg.stats as stats
+
+DESCRIPTION = '''
+FreqRespGraph can plot single or multiple frequency response graphs given as CSV data files in a single graph.
+X and Y Axis limit can be configured. Data can be aligned to 0dB at a given frequency or frequency range. In
+addition a reference curve can be specified. Filter settings for a parametric equalizer can be specified to
+additionally plot the equalizer response and curve(s) equalized by it. Curves can be smoothed by a given
+fraction of an octave using a Savitzky-Golay filter with first order polynom. The CSV data files needs to
+contain 2 rows with frequency and SPL. Additionally an impedance curve and amplifier inner resistance can
+be specified to calculate the effect on the frequency response.
+'''
+
+
+# Command line parser, also used for the graphs of job files
+def createParser():
+    parser = argparse.ArgumentParser(prog='FreqRespGraph', description=DESCRIPTION)
+    parser.add_argument('--ymin', nargs='?', type=float, default='-30', help='Y-Axis minumum, default -30db')
+    parser.add_argument('--ymax', nargs='?', type=float, default='20', help='Y-Axis maximum, default 20db')
+    parser.add_argument('--xmin', nargs='?', type=float, default='20', help='X-Axis minumum, default 20Hz')
+    parser.add_argument('--xmax', nargs='?', type=float, default='20000', help='X-Axis maximum, default 20000Hz')
+    parser.add_argument('--alignmin', nargs='?', type=float, default='-1', help='Align Y-Axis at given frequency to 0 dB, default off')
+    parser.add_argument('--alignmax', nargs='?', type=float, default='-1', help='Align Y-Axis at frequency range to 0 dB, default off')
+    parser.add_argument('--alignweight', nargs='?', choices=curves.ALIGN_WEIGHTINGS, default='points', help='Average the alignment range over its data points (default) or over logarithmic frequency (log), which weights every octave equally regardless of the point density of the curve')
+    parser.add_argument('--hidealignment', action='store_true', help='Do not show aligment arguments in Y-Axis label, default off')
+    parser.add_argument('--refcurve', nargs='?', default='', help='Plot given CSV file as dotted reference curve, default off')
+    parser.add_argument('--nolegend', action='store_true', help='Do not show curves legend, default off')
+    parser.add_argument('--compensate', action='store_true', help='Compensate according to given reference curve, default off')
+    parser.add_argument('--title', nargs='?', default='', help='Set graph title, default off')
+    parser.add_argument('--peq', nargs='*', default='', help='Apply given PEQ settings, format for each filter is PEAK|LOWSHELF|HIGHSHELF|LOWPASS|HIGHPASS|BANDPASS|NOTCH,<Freq>,<Q>,<Gain>, default none')
+    parser.add_argument('--fpeq', nargs='?', type=float, default='48000', help='Sampling frequency used to simulate PEQ, default 48000')
+    parser.add_argument('--view', nargs='?', choices=phase.VIEWS, default='spl', help='Plot SPL (default), phase or group delay of the PEQ filters or minimum phase derived from the curves, the Y-Axis is scaled automatically for phase views')
+    parser.add_argument('--peqverify', action='store_true', help='Plot the PEQ response measured by FFT of the impulse response of the filters on top of the calculated equalizer curve')
+    parser.add_argument('--peqwav', nargs=2, default=[], metavar=('INPUT', 'OUTPUT'), help='Filter WAV file INPUT by the --peq filters and write the result to WAV file OUTPUT')
+    parser.add_argument('--hidepeq', action='store_true', help='Hide equalizer curve')
+    parser.add_argument('--smooth', nargs='?', default='-1', help='Smooth curves according to given fraction of an octave, e.g. 1/12, 0.5 or 1, default off')
+    parser.add_argument('--smoothonly', action='store_true', help='Only show smoothed curves')
+    parser.add_argument('--zeq_file', nargs='?', default='', help='CSV filename with impedance data to calculate EQ due to impedance change, requires zeq_r')
+    parser.add_argument('--zeq_r', nargs='*', type=float, default=[], help='Inner resistance of amplifier, multiple values compare the resulting curves, e.g. 0 10 33 120 470')
+    parser.add_argument('--zeq_csvdelimiter', nargs='?', default=',', help='Delimiter character used in impedance data CSV file, default ","')
+    parser.add_argument('--csvdelimiter', nargs='?', default=',', help='Delimiter character used in CSV files, default ","')
+    parser.add_argument('--cachedir', nargs='?', default=csvdata.DEFAULT_CACHE_DIR, help='Directory used to cache parsed CSV files, default "' + csvdata.DEFAULT_CACHE_DIR + '"')
+    parser.add_argument('--nocache', action='store_true', help='Do not use or update the cache of parsed CSV files and derived curves')
+    parser.add_argument('--clearcache', action='store_true', help='Remove all parsed CSV files from the cache directory, the cache is limited to ' + str(csvdata.CACHE_SIZE // (1024 * 1024)) + ' MB otherwise')
+    parser.add_argument('--memodir', nargs='?', const=memo.DEFAULT_MEMO_DIR, default='', help='Also store derived curves in given directory (default "' + memo.DEFAULT_MEMO_DIR + '") to reuse them in later runs')
+    parser.add_argument('--jobs', nargs='?', type=int, default=1, help='Number of worker processes used to read and process CSV files or to render the graphs of a job file, 0 uses all CPU cores, default 1')
+    parser.add_argument('--files', nargs='*',  default=[], help='CSV filenames to be plotted (supports filename wildcards)')
+    parser.add_argument('--maxlines', nargs='?', type=int, default=200, help='Draw curves as one decimated line collection if more than given number of curves are plotted, -1 never does, default 200')
+    parser.add_argument('--jobfile', nargs='?', default='', help='Render all graphs listed in given JSON or YAML job file into image files without showing them')
+    parser.add_argument('--incremental', action='store_true', help='Only render the images of --jobfile whose settings, input files or image changed since the last run')
+    parser.add_argument('--index', nargs='?', default=curvedb.DEFAULT_INDEX_DIR, help='Directory of the measurement index, default "' + curvedb.DEFAULT_INDEX_DIR + '"')
+    parser.add_argument('--buildindex', nargs='?', default='', help='Create or update the measurement index with all CSV files of given directory tree, e.g. AutoEq/measurements')
+    parser.add_argument('--vendor', nargs='*', default=[], help='Plot indexed curves of given vendors (supports wildcards)')
+    parser.add_argument('--model', nargs='*', default=[], help='Plot indexed curves of given models (supports wildcards)')
+    parser.add_argument('--source', nargs='*', default=[], help='Plot indexed curves of given measurement sources (supports wildcards), e.g. oratory1990')
+    parser.add_argument('--type', nargs='*', default=[], help='Plot indexed curves of given form factors (supports wildcards), e.g. over-ear')
+    parser.add_argument('--stats', nargs='*', choices=stats.STATS, default=None, help='Plot statistical aggregates of all curves instead of the curves, any of ' + ', '.join(stats.STATS) + ', default ' + ' '.join(stats.DEFAULT_STATS))
+    parser.add_argument('--percentiles', nargs='*', type=float, default=[10, 25], help='Percentile bands shown by --stats, e.g. 10 shows the band from 10 to 90 percent, default 10 25')
+    parser.add_argument('--groupby', nargs='?', choices=stats.GROUPS, default='none', help='Show --stats aggregates per ' + ', '.join(stats.GROUPS[1:]) + ', default none')
+    parser.add_argument('--match', nargs='?', default='', help='Plot the curves closest to given target CSV file, candidates are the given files or the whole measurement index')
+    parser.add_argument('--metric', nargs='?', choices=search.METRICS, default='rms', help='Distance used by --match: rms deviation within xmin...xmax or predicted preference of the Harman headphone model, default rms')
+    parser.add_argument('--top', nargs='?', type=int, default=10, help='Number of curves shown by --match, default 10')
+    parser.add_argument('--peqfit', nargs='?', type=int, default=0, help='Fit given number of PEQ filters to equalize each curve to the reference curve, prints the filters in --peq format, default off')
+    parser.add_argument('--decimate', nargs='?', choices=csvdata.DECIMATE_MODES, default='', help='Read CSV files block by block and reduce them to logarithmic frequency bins using the mean, min and max or power average of each bin, for very large files, default off')
+    parser.add_argument('--decimatebins', nargs='?', type=int, default=csvdata.DEFAULT_BINS_PER_OCTAVE, help='Bins per octave used by --decimate, default ' + str(csvdata.DEFAULT_BINS_PER_OCTAVE))
+    parser.add_argument('--interactive', action='store_true', help='Show sliders to change alignment, smoothing and PEQ filters while viewing the graph')
+    parser.add_argument('--profile', nargs='?', const='-', default='', help='Print time, points and peak memory of each processing stage and the slowest files, write all records to given JSON file')
+    parser.add_argument('--profilehook', choices=profiling.HOOKS, default='', help='Run --profile under cProfile (slowest functions) or tracemalloc (largest allocations and traced peak memory)')
+    parser.add_argument('--serve', nargs='?', type=int, const=8765, default=0, help='Run render server on given localhost port (default 8765) returning PNG or SVG graphs per HTTP request')
+    parser.add_argument('--serveroot', nargs='?', default='.', help='Directory of the files the render server can plot, file names of requests are relative to it, default current directory')
+    return parser
+
+
+# Parse smoothing octave fraction, e.g. 1/12. Only numbers and divisions are accepted, the value may come from
+# requests of the render server.
+def parseSmooth(smoothstr):
+    try:
+        parts = str(smoothstr).split('/')
+        smooth = float(parts[0])
+        for p in parts[1:]:
+            smooth = smooth / float(p)
+        return smooth
+    except (ValueError, ZeroDivisionError):
+        print( 'Invalid smooth value: ' , smoothstr)
+        print( 'Expected number or fraction, e.g 1, 0.33 or 1/12')
+        sys.exit(1)
+
+
+# Parse PEQ settings, returns filter bank or None if no filter is given
+def parsePeq(peqargs, fpeq):
+    biquads = []
+    for p in peqargs:
+        biquad_args = p.split(',')
+        if len(biquad_args) == 4:
+            try:
+                biquads.append(bq.Biquad(bq.Biquad.__dict__[biquad_args[0]], float(biquad_args[1]), fpeq, float(biquad_args[2]), float(biquad_args[3])))
+            except (ValueError, KeyError) as ve:
+                print( 'Invalid PEQ: ' , p)
+                print( 'Expected format: PEAK|LOWSHELF|HIGHSHELF|LOWPASS|HIGHPASS|BANDPASS|NOTCH,<Freq>,<Q>,<Gain>')
+                sys.exit(1)
+        else:
+            print( 'Invalid PEQ: ' , p)
+            print( 'Expected format: PEAK|LOWSHELF|HIGHSHELF|LOWPASS|HIGHPASS|BANDPASS|NOTCH,<Freq>,<Q>,<Gain>')
+            sys.exit(1)
+    if len(biquads) == 0:
+        return None
+    # Evaluate all PEQ filters at once over whole frequency arrays
+    return bq.BiquadBank(biquads)
+
+
+# PEQ filter types in the order of the Biquad type enumeration
+PEQ_TYPES = ('LOWPASS', 'HIGHPASS', 'BANDPASS', 'PEAK', 'NOTCH', 'LOWSHELF', 'HIGHSHELF')
+
+
+# Format PEQ filter as --peq argument, e.g. PEAK,1000,1.41,-3
+def formatPeq(biquad):
+    return PEQ_TYPES[biquad.typ] + ',' + ('%g' % biquad.freq) + ',' + ('%g' % biquad.Q) + ',' + ('%g' % biquad.dbGain)
+
+
+# Expand filename wildcards of all given file patterns
+def expandFiles(filepatterns):
+    files = []
+    for filepattern in filepatterns:
+        files.extend(glob.glob(filepattern))
+    return files
+
+
+# Whether curves are selected from the measurement index
+def indexSelection(args):
+    return len(args.vendor) > 0 or len(args.model) > 0 or len(args.source) > 0 or len(args.type) > 0
+
+
+# Whether the measurement index is used, --match searches the whole index if no curves are given
+def usesIndex(args):
+    return indexSelection(args) or (args.match != '' and len(args.files) == 0)
+
+
+# Curves selected from the measurement index
+def indexFiles(args):
+    if not usesIndex(args):
+        return []
+    index = curvedb.openIndex(args.index)
+    if index is None:
+        print( 'No measurement index found in ', args.index, ', create it using --buildindex')
+        sys.exit(1)
+    return index.select(args.vendor, args.model, args.source, args.type)
+
+
+# Files to be plotted: expanded --files patterns followed by the curves selected from the measurement index
+def selectFiles(args):
+    return expandFiles(args.files) + indexFiles(args)
+
+
+# Y-Axis label for given command line arguments
+def axisLabel(args):
+    if args.view != 'spl':
+        return phase.viewLabel(args.view)
+    if args.refcurve != '' and args.compensate:
+        ylabel = 'Compensated SPL [dB]'
+    else:
+        ylabel = 'SPL [dB]'
+    if not args.hidealignment and args.alignmin > 0:
+        if args.alignmax > 0:
+            ylabel = ylabel + '\n(Aligned to 0db at ' + str(int(args.alignmin)) + '...' + str(int(args.alignmax)) + ' Hz' + (', log weighted' if args.alignweight == 'log' else '') + ')'
+        else:
+            ylabel = ylabel + '\n(Aligned to 0db at ' + str(int(args.alignmin)) + ' Hz)'
+    return ylabel
+
+
+# Frequency response graph drawn into a matplotlib figure, the figure can be reused for several graphs
+class Graph:
+
+    def __init__(self, fig):
+        self.fig = fig
+        self.ax = None
+        self.lines = []
+        self.handles = []
+        self.map_legend_to_ax = {}  # Will map legend lines to original lines.
+        self.collections = []
+        self.args = None
+        self.options = None
+        self.traces = []
+        self.legend = None
+        self.fig.canvas.mpl_connect('pick_event', self.on_pick)
+
+    # On legend pick event, highlight curve (first click), hide curve (second click) or switch back to default (third click)
+    def on_pick(self, event):
+        legend_line = event.artist
+
+        # Do nothing if the source of the event is not a legend line.
+        if legend_line not in self.map_legend_to_ax:
+            return
+
+        ax_line = self.map_legend_to_ax[legend_line]
+        lw = ax_line.get_linewidth()
+        visible = ax_line.get_visible()
+        if visible and lw < 2.0:
+            # Higlight
+            ax_line.set_linewidth(4.0)
+            legend_line.set_alpha(1.0)
+            ax_line.set_zorder(10)
+        if visible and lw > 2.0:
+            # Hide
+            ax_line.set_linewidth(1.5)
+            ax_line.set_visible(False)
+            legend_line.set_alpha(0.2)
+            ax_line.set_zorder(2)
+        if not visible:
+            # Back to default
+            ax_line.set_visible(True)
+            ax_line.set_zorder(2)
+            legend_line.set_alpha(1.0)
+        # Redraw once the GUI is idle, fast clicks are combined into a single redraw
+        self.fig.canvas.draw_idle()
+
+    # Redraw after curve data has been changed using set_data() of the curve lines
+    def refresh(self):
+        for collection in self.collections:
+            collection.refresh()
+        self.fig.canvas.draw_idle()
+
+    # Draw single curve
+    def plotTrace(self, trace):
+        if trace.color is None:
+            (line, ) = self.ax.plot(trace.x, trace.y, trace.fmt, lw=1.5, label=trace.label)
+        else:
+            (line, ) = self.ax.plot(trace.x, trace.y, trace.fmt, lw=1.5, color=trace.color, label=trace.label)
+        self.lines.append(line)
+        self.handles.append(line)
+
+    # Draw given curves. If there are more than maxlines solid curves (maxlines >= 0) they are drawn as a single
+    # decimated line collection instead of one line per curve. The curve lines are added to self.lines in the order
+    # of the traces.
+    def drawTraces(self, traces, maxlines=-1):
+        solid = [trace for trace in traces if trace.fmt == '-']
+        if maxlines < 0 or len(solid) <= maxlines:
+            for trace in traces:
+                self.plotTrace(trace)
+            return
+        colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+        collection = curvecollection.CurveCollection(self.ax, solid, [trace.color or colors[i % len(colors)] for i, trace in enumerate(solid)])
+        self.collections.append(collection)
+        i = 0
+        for trace in traces:
+            if trace.fmt == '-':
+                self.lines.append(collection.curveHandle(i))
+                self.handles.append(collection.legendHandle(i, trace.label))
+                i = i + 1
+            else:
+                self.plotTrace(trace)
+
+    # Draw filled bands between lower and upper curves, the bands are added to the legend but can't be picked
+    def drawBands(self, bands):
+        for band in bands:
+            self.handles.append(self.ax.fill_between(band.x, band.lower, band.upper, color=band.color, alpha=band.alpha, lw=0, label=band.label))
+
+    # Draw graph for given command line arguments, curves are processed by jobs worker processes
+    def render(self, args, jobs=1):
+        smooth = parseSmooth(args.smooth)
+        peq = parsePeq(args.peq, args.fpeq)
+        hidepeq = args.hidepeq or peq is None
+        cachedir = None if args.nocache else args.cachedir
+
+        # Initialize layout
+        self.fig.clear()
+        self.ax = self.fig.add_subplot()
+        self.lines = []
+        self.handles = []
+        self.map_legend_to_ax = {}
+        self.collections = []
+        self.legend = None
+        ax = self.ax
+        traces = []
+
+        # No reference curve
+        ref = None
+        if args.refcurve != '' and args.compensate:
+            #  Read reference curve data for compensation, prepared once for all curves
+            xref, yref = csvdata.loadCurve(args.refcurve, ',', cachedir)
+            ref = curves.RefCurve(xref, yref)
+
+        # No impedance EQ
+        zeq = None
+        if len(args.zeq_r) > 0 and min(args.zeq_r) >= 0 and max(args.zeq_r) > 0 and args.zeq_file != '' :
+            # Define Impedance EQ for all given source resistances at once and show impedance EQ curves
+            xz, z = csvdata.loadCurve(args.zeq_file, args.zeq_csvdelimiter, cachedir)
+            zeq = impedance.ImpedanceEq(xz, z, args.zeq_r)
+            traces.extend(pipeline.impedanceTraces(zeq))
+
+        # Calculate curves for each given CSV, in parallel if requested, and keep them in the given order
+        files = expandFiles(args.files)
+        selected = indexFiles(args)
+        # Only curves selected from the index are taken from it, given files are read in full resolution
+        indexed = frozenset(selected) - frozenset(os.path.abspath(f) for f in files)
+        files = files + selected
+        options = pipeline.CurveOptions(args.alignmin, args.alignmax, args.csvdelimiter, ref, peq, zeq, smooth, args.smooth, args.smoothonly, cachedir, args.index if usesIndex(args) else None, (args.decimate, args.decimatebins) if args.decimate != '' else None, args.memodir or None, args.alignweight, indexed)
+        if args.match != '':
+            # Only plot the curves closest to the target curve
+            matchoptions = pipeline.CurveOptions(args.alignmin, args.alignmax, args.csvdelimiter, smooth=smooth, cachedir=cachedir, index=options.index, decimate=options.decimate, alignweight=args.alignweight, indexed=indexed)
+            with profiling.stage('match', args.match, len(files)):
+                matches = search.findMatches(args.match, files, matchoptions, args.metric, args.top, args.xmin, args.xmax, jobs)
+            search.printMatches(matches, args.match, args.metric)
+            files = [filename for filename, score in matches]
+        bands = []
+        if args.peqfit > 0:
+            # Fit PEQ filters for every curve and show each curve equalized by its own filters
+            if args.refcurve == '':
+                print( 'PEQ fitting requires a reference curve, use --refcurve')
+                sys.exit(1)
+            xfit, yfit = csvdata.loadCurve(args.refcurve, ',', cachedir)
+            fitoptions = pipeline.CurveOptions(args.alignmin, args.alignmax, args.csvdelimiter, curves.RefCurve(xfit, yfit), smooth=smooth, cachedir=cachedir, index=options.index, decimate=options.decimate, alignweight=args.alignweight, indexed=indexed)
+            with profiling.stage('peqfit', '', len(files)):
+                fitted = peqfit.fitFiles(files, fitoptions, args.peqfit, args.xmin, args.xmax, args.fpeq, jobs)
+            for filename, biquads in zip(files, fitted):
+                print( filename, ': --peq', ' '.join(formatPeq(b) for b in biquads))
+                fileoptions = copy.copy(options)
+                fileoptions.peq = bq.BiquadBank(biquads) if len(biquads) > 0 else None
+                traces.extend(pipeline.withOptions(pipeline.processCurve(filename, fileoptions, False, len(files) == 1 and not args.hidepeq and fileoptions.peq is not None), fileoptions))
+        elif args.stats is not None:
+            # Aggregates of all curves on a shared grid instead of single curves
+            grid = smoothing.logGrid(float(args.xmin), float(args.xmax))
+            with profiling.stage('stats', '', len(files)):
+                stattraces, bands = stats.aggregateFiles(files, options, grid, args.stats or stats.DEFAULT_STATS, args.percentiles, args.groupby, jobs)
+            traces.extend(stattraces)
+        else:
+            for filetraces in pipeline.processFiles(files, options, jobs, not hidepeq):
+                traces.extend(pipeline.withOptions(filetraces, options))
+
+        # Check calculated equalizer curve against the response of the filters measured by FFT
+        if args.peqverify and peq is not None:
+            xm, ym = audio.measuredResponse(peq)
+            visible = (xm >= args.xmin) & (xm <= args.xmax)
+            deviation = np.max(np.abs(ym[visible] - peq.log_result(xm[visible]))) if np.any(visible) else 0
+            print( 'PEQ measured by FFT deviates from calculated equalizer curve by %.3g dB at most' % deviation)
+            traces.append(pipeline.Trace(xm, ym, 'Equalizer (measured by FFT)', ':', kind='measured_equalizer'))
+
+        # Draw referance curve if given
+        if args.refcurve != '':
+            refoptions = pipeline.CurveOptions(args.alignmin, args.alignmax, args.csvdelimiter, ref, cachedir=cachedir, memodir=options.memodir, alignweight=args.alignweight)
+            traces.extend(pipeline.withOptions(pipeline.processCurve(args.refcurve, refoptions, True), refoptions))
+
+        # Draw target curve of match search
+        if args.match != '' and args.match != args.refcurve:
+            matchoptions = pipeline.CurveOptions(args.alignmin, args.alignmax, args.csvdelimiter, cachedir=cachedir, alignweight=args.alignweight)
+            traces.extend(pipeline.withOptions(pipeline.processCurve(args.match, matchoptions, True), matchoptions))
+
+        # Replace SPL curves by phase or group delay
+        if args.view != 'spl':
+            if peq is None and args.view != 'minphase':
+                print( 'Phase and group delay views require PEQ filters, use --peq')
+                sys.exit(1)
+            traces = phase.viewTraces(traces, args.view, peq, args.xmin, args.xmax, args.fpeq / 2, [formatPeq(b) for b in peq.biquads] if peq is not None else [])
+            bands = []
+        with profiling.stage('draw', '', sum(len(t.x) for t in traces)):
+            self.drawTraces(traces, args.maxlines)
+            self.drawBands(bands)
+        # Keep curves and processing options for interactive changes
+        self.args = args
+        self.options = options
+        self.traces = traces
+
+        # Draw Legend if not disabled
+        if not args.nolegend:
+            leg=ax.legend(handles=self.handles, loc='center left', bbox_to_anchor=(1.01, 0.5), fontsize='xx-small', draggable=True)
+            self.legend = leg
+            pickradius = 5  # Points (Pt). How close the click needs to be to trigger an event.
+            for legend_line, ax_line in zip(leg.get_lines(), self.lines):
+                legend_line.set_picker(pickradius)  # Enable picking on the legend line.
+                self.map_legend_to_ax[legend_line] = ax_line
+
+        # Set logarithmic scale on the x axis
+        ax.set_xscale("log");
+
+        # Set Axis limits
+        ax.set_xlim(args.xmin,args.xmax)
+        if args.view == 'spl':
+            ax.set_ylim(args.ymin,args.ymax)
+        else:
+            for collection in self.collections:
+                collection.updateDataLim()
+            ax.autoscale_view(scalex=False)
+
+        # X-Axis minor ticks labels
+        def myformatter(x, pos):
+            if x == args.xmin:
+                return str(int(args.xmin))
+            if x == args.xmax:
+                return str(int(args.xmax))
+            return ''
+
+        # Set X Axis major and minor ticks
+        formatter = LogFormatter()
+        ax.xaxis.set_major_formatter(formatter)
+        formatter2 = FuncFormatter(myformatter)
+        ax.xaxis.set_minor_formatter(formatter2)
+
+        # Set Axis labels
+        ax.set_xlabel('Frequency [Hz]')
+        ax.set_ylabel(axisLabel(args))
+
+        # Enable grid lines
+        ax.grid(which='both')
+
+        # Set Title if given
+        if args.title != '':
+            ax.set_title(args.title)
+        return len(files)
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+# Frequency response change caused by the voltage divider of amplifier source resistance and load impedance, for
+# one or more source resistances at once. The EQ is normalized to 0 dB at the impedance minimum.
+class ImpedanceEq:
+
+    def __init__(self, x, z, resistances):
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        self.resistances = np.atleast_1d(np.asarray(resistances, dtype=np.float64))
+        zmin = np.min(z) if len(z) > 0 else 0
+        r = self.resistances[:, None]
+        normalize = (r+zmin)/zmin
+        # EQ curve for every resistance (rows) and impedance frequency (columns)
+        self.eq = 20 * np.log10(z[None, :]/(r+z[None, :]) * normalize)
+
+    def __len__(self):
+        return len(self.resistances)
+
+    # EQ for every resistance at frequencies f, shape (resistances, len(f)). Uses linear interpolation of the
+    # impedance data and linear extrapolation outside of its frequency range.
+    def __call__(self, f):
+        f = np.asarray(f, dtype=np.float64)
+        n = len(self.x)
+        if n == 1:
+            return np.repeat(self.eq, len(f), axis=1)
+        hi = np.clip(np.searchsorted(self.x, f), 1, n - 1)
+        lo = hi - 1
+        slope = (self.eq[:, hi] - self.eq[:, lo]) / (self.x[hi] - self.x[lo])
+        return slope * (f - self.x[lo]) + self.eq[:, lo]
+
+    # Apply EQ to curve, returns one equalized curve per resistance
+    def apply(self, f, y):
+        return np.asarray(y, dtype=np.float64)[None, :] + self(f)
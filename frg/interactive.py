@@ -0,0 +1,270 @@
+import argparse
+import math
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.widgets import Slider, SpanSelector
+import bq.biquad as bq
+import frg.curvecollection as curvecollection
+import frg.curves as curves
+import frg.graph as graph
+import frg.pipeline as pipeline
+import frg.smoothing as smoothing
+
+# Slider ranges
+FREQ_MIN = 10
+FREQ_MAX = 24000
+Q_MIN = 0.1
+Q_MAX = 10
+GAIN_MAX = 20
+SMOOTH_MAX = 48
+
+# Alignment range shown in the graph
+SPAN_COLOR = 'tab:blue'
+SPAN_ALPHA = 0.1
+
+# Curve kinds to be recalculated if a setting changes
+ALIGN_KINDS = ('curve', 'ref', 'zeq', 'peq', 'smoothed', 'zeq_smoothed', 'peq_smoothed')
+SMOOTH_KINDS = ('smoothed', 'zeq_smoothed', 'peq_smoothed')
+PEQ_KINDS = ('equalizer', 'peq', 'peq_smoothed')
+
+
+# Curve data of one CSV file. Keeps the compensated data and all intermediate results which don't depend on the
+# changed setting, e.g. the smoothed curve is aligned by subtracting the alignment offset instead of smoothing again.
+# The alignment offset of any frequency range is taken from the prefix sums of the curve (curves.AlignIndex). The
+# curve is processed with the options it was drawn with, e.g. its own fitted PEQ filters (--peqfit) or without
+# compensation (--match target).
+class Source:
+
+    def __init__(self, filename, options):
+        self.options = options
+        self.x, self.y = pipeline.loadCompensated(filename, options)
+        self.alignindex = curves.AlignIndex(self.x, self.y, options.alignweight)
+        self.offset = 0
+        self.zeq = options.zeq(self.x) if options.zeq is not None else None
+        self.biquads = list(options.peq.biquads) if options.peq is not None else []
+        # PEQ filter responses, one row per filter
+        self.peq = filterResponses(self.biquads, self.x)
+        self.xs = self.ys = self.zeqs = self.peqs = None
+
+    def align(self, alignmin, alignmax):
+        self.offset = self.alignindex.offset(alignmin, alignmax) if alignmin > 0 else 0
+
+    def smooth(self, fraction):
+        self.xs, self.ys = smoothing.smoothCurve(self.x, self.y, fraction)
+        self.zeqs = self.options.zeq(self.xs) if self.options.zeq is not None else None
+        self.peqs = filterResponses(self.biquads, self.xs)
+
+    # Recalculate response of changed PEQ filter i only
+    def updateFilter(self, i, biquad):
+        self.biquads[i] = biquad
+        self.peq[i] = filterResponses([biquad], self.x)[0]
+        if self.xs is not None:
+            self.peqs[i] = filterResponses([biquad], self.xs)[0]
+
+    # Curve data of given trace
+    def traceData(self, trace):
+        kind = trace.kind
+        if kind == 'equalizer':
+            return self.x, np.sum(self.peq, axis=0)
+        if kind in SMOOTH_KINDS:
+            x, y = self.xs, self.ys - self.offset
+            zeq, peq = self.zeqs, self.peqs
+        else:
+            x, y = self.x, self.y - self.offset
+            zeq, peq = self.zeq, self.peq
+        if kind in ('zeq', 'zeq_smoothed'):
+            return x, y + zeq[trace.index]
+        if kind in ('peq', 'peq_smoothed'):
+            return x, y + np.sum(peq, axis=0)
+        return x, y
+
+
+# Log responses of given filters at frequencies f, shape (filters, len(f))
+def filterResponses(biquads, f):
+    if len(biquads) == 0:
+        return np.zeros((0, len(f)))
+    return bq.BiquadBank(biquads).log_results(f)
+
+
+# Sliders shown in a separate window to change alignment, smoothing and PEQ filters of a rendered graph. Only the
+# curves depending on the changed setting are recalculated, the CSV data is read once. Dragging a frequency range in
+# the graph aligns all curves to it.
+class Controls:
+
+    def __init__(self, g):
+        self.graph = g
+        self.args = argparse.Namespace(**vars(g.args))
+        options = g.options
+        # PEQ filters of the sliders, only applied to curves drawn with them
+        self.peq = options.peq
+        self.biquads = list(options.peq.biquads) if options.peq is not None else []
+        self.smooth = options.smooth
+        self.smoothstr = options.smoothstr
+        # Source of each trace, a file drawn with different options (e.g. as curve and as reference) has a source
+        # per options
+        self.sources = {}
+        self.traceSources = []
+        for trace in g.traces:
+            source = None
+            if trace.source is not None and trace.options is not None:
+                key = (trace.source, id(trace.options))
+                if key not in self.sources:
+                    self.sources[key] = Source(trace.source, trace.options)
+                    self.sources[key].align(self.args.alignmin, self.args.alignmax)
+                source = self.sources[key]
+            self.traceSources.append(source)
+        if self.smooth > 0:
+            for source in self.sources.values():
+                source.smooth(self.smooth)
+
+        # Alignment range selected by dragging in the graph, curves are aligned while dragging
+        self.span = SpanSelector(g.ax, self.on_span, 'horizontal', onmove_callback=self.on_span, interactive=True, drag_from_anywhere=True, props=dict(facecolor=SPAN_COLOR, alpha=SPAN_ALPHA))
+        if self.args.alignmin > 0 and self.args.alignmax > 0:
+            self.span.extents = (self.args.alignmin, self.args.alignmax)
+        self.span.set_visible(self.args.alignmax > 0)
+
+        # One slider row per setting
+        rows = []
+        self.alignSliders = {}
+        if self.args.alignmin > 0:
+            rows.append(('Align min', self.frequencySlider, self.args.alignmin, self.on_alignmin))
+            if self.args.alignmax > 0:
+                rows.append(('Align max', self.frequencySlider, self.args.alignmax, self.on_alignmax))
+        if self.smooth > 0:
+            rows.append(('Smoothing 1/N oct', self.smoothSlider, self.smooth, self.on_smooth))
+        for i, biquad in enumerate(self.biquads):
+            name = 'PEQ ' + str(i+1) + ' ' + graph.PEQ_TYPES[biquad.typ]
+            rows.append((name + ' freq', self.frequencySlider, biquad.freq, self.filterHandler(i, 'freq')))
+            rows.append((name + ' Q', self.qSlider, biquad.Q, self.filterHandler(i, 'Q')))
+            rows.append((name + ' gain', self.gainSlider, biquad.dbGain, self.filterHandler(i, 'dbGain')))
+        self.sliders = []
+        if len(rows) == 0:
+            print( 'Drag a frequency range in the graph to align the curves, use --smooth or --peq for more controls')
+            g.fig.canvas.mpl_connect('close_event', self.on_close)
+            return
+        height = 0.35 * len(rows) + 0.3
+        self.fig = plt.figure('FreqRespGraph controls', figsize=(6, height))
+        for n, (label, create, value, handler) in enumerate(rows):
+            ax = self.fig.add_axes([0.35, 1 - (n+1) * 0.35 / height, 0.45, 0.2 / height])
+            slider = create(ax, label, value)
+            slider.on_changed(handler)
+            if create == self.frequencySlider:
+                slider.on_changed(lambda value, slider=slider: slider.valtext.set_text('%d Hz' % 10**value))
+            if handler == self.on_alignmin:
+                self.alignSliders['alignmin'] = slider
+            elif handler == self.on_alignmax:
+                self.alignSliders['alignmax'] = slider
+            self.sliders.append(slider)
+        self.fig.canvas.mpl_connect('close_event', self.on_close)
+
+    # Slider of frequency on logarithmic scale
+    def frequencySlider(self, ax, label, value):
+        slider = Slider(ax, label, math.log10(FREQ_MIN), math.log10(FREQ_MAX), valinit=math.log10(min(max(value, FREQ_MIN), FREQ_MAX)))
+        slider.valtext.set_text('%d Hz' % value)
+        return slider
+
+    def qSlider(self, ax, label, value):
+        return Slider(ax, label, Q_MIN, Q_MAX, valinit=min(max(value, Q_MIN), Q_MAX), valfmt='%.2f')
+
+    def gainSlider(self, ax, label, value):
+        return Slider(ax, label, -GAIN_MAX, GAIN_MAX, valinit=min(max(value, -GAIN_MAX), GAIN_MAX), valfmt='%.1f dB')
+
+    def smoothSlider(self, ax, label, value):
+        return Slider(ax, label, 1, SMOOTH_MAX, valinit=min(max(round(1/value), 1), SMOOTH_MAX), valstep=1, valfmt='%d')
+
+    def on_alignmin(self, value):
+        self.args.alignmin = 10**value
+        self.showSpan()
+        self.align()
+
+    def on_alignmax(self, value):
+        self.args.alignmax = 10**value
+        self.showSpan()
+        self.align()
+
+    # Show alignment range set by the sliders in the graph
+    def showSpan(self):
+        if self.args.alignmax > self.args.alignmin:
+            self.span.extents = (self.args.alignmin, self.args.alignmax)
+        self.span.set_visible(self.args.alignmax > self.args.alignmin)
+
+    # Align to the frequency range dragged in the graph
+    def on_span(self, fmin, fmax):
+        if fmin <= 0 or fmax <= fmin:
+            return
+        self.args.alignmin = fmin
+        self.args.alignmax = fmax
+        for name, slider in self.alignSliders.items():
+            value = getattr(self.args, name)
+            # Move slider without calling its handlers
+            slider.eventson = False
+            slider.set_val(math.log10(min(max(value, FREQ_MIN), FREQ_MAX)))
+            slider.eventson = True
+            slider.valtext.set_text('%d Hz' % value)
+        self.align()
+
+    # Align all curves, curves drawn by a curve collection are moved by the change of their offset instead of being
+    # decimated again
+    def align(self):
+        shifts = {}
+        for key, source in self.sources.items():
+            offset = source.offset
+            source.align(self.args.alignmin, self.args.alignmax)
+            shifts[key] = offset - source.offset
+        self.graph.ax.set_ylabel(graph.axisLabel(self.args))
+        for trace, line, source in zip(self.graph.traces, self.graph.lines, self.traceSources):
+            if trace.kind in ALIGN_KINDS and source is not None:
+                if isinstance(line, curvecollection.CollectionCurve):
+                    line.shift(shifts[(trace.source, id(trace.options))])
+                else:
+                    line.set_data(*source.traceData(trace))
+        self.graph.refresh()
+
+    def on_smooth(self, value):
+        smoothstr = '1/' + str(int(value))
+        self.smooth = 1 / int(value)
+        for source in self.sources.values():
+            source.smooth(self.smooth)
+        # Show new octave fraction in the legend
+        for i, trace in enumerate(self.graph.traces):
+            if trace.kind in SMOOTH_KINDS:
+                trace.label = trace.label.replace(self.smoothstr + ' oct smoothed', smoothstr + ' oct smoothed')
+                if self.graph.legend is not None:
+                    self.graph.legend.get_texts()[i].set_text(trace.label)
+        self.smoothstr = smoothstr
+        self.update(SMOOTH_KINDS)
+
+    # Slider handler changing given parameter of PEQ filter i
+    def filterHandler(self, i, parameter):
+        def on_filter(value):
+            biquad = self.biquads[i]
+            settings = {'freq': biquad.freq, 'Q': biquad.Q, 'dbGain': biquad.dbGain}
+            settings[parameter] = 10**value if parameter == 'freq' else value
+            self.biquads[i] = bq.Biquad(biquad.typ, settings['freq'], biquad.srate, settings['Q'], settings['dbGain'])
+            for source in self.sources.values():
+                if source.options.peq is self.peq:
+                    source.updateFilter(i, self.biquads[i])
+            self.update(PEQ_KINDS)
+        return on_filter
+
+    # Set recalculated data of all curves of given kinds and redraw
+    def update(self, kinds):
+        for trace, line, source in zip(self.graph.traces, self.graph.lines, self.traceSources):
+            if trace.kind in kinds and source is not None:
+                line.set_data(*source.traceData(trace))
+        self.graph.refresh()
+
+    # Print settings to reproduce the graph from the command line
+    def on_close(self, event):
+        settings = []
+        if self.args.alignmin > 0:
+            settings.append('--alignmin=%d' % self.args.alignmin)
+            if self.args.alignmax > 0:
+                settings.append('--alignmax=%d' % self.args.alignmax)
+            if self.args.alignweight != 'points':
+                settings.append('--alignweight=' + self.args.alignweight)
+        if self.smooth > 0:
+            settings.append('--smooth=' + self.smoothstr)
+        if len(self.biquads) > 0:
+            settings.append('--peq ' + ' '.join(graph.formatPeq(b) for b in self.biquads))
+        print( 'Current settings: ', ' '.join(settings))
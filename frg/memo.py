@@ -0,0 +1,154 @@
+import collections
+import hashlib
+import json
+import os
+import numpy as np
+
+# Memoization of derived curves: the traces calculated from a CSV file are stored under a hash of the file contents
+# and all processing settings (alignment, reference curve, smoothing, PEQ filters, impedance EQ, ...). Identical
+# processing of unchanged files is taken from memory (least recently used traces are dropped above MEMORY_SIZE) or,
+# if a memo directory is given, from .npz files written by earlier runs. Files are only hashed again if their
+# modification time or size changes.
+
+# Bump if the layout of memoized traces changes
+MEMO_VERSION = 1
+
+# Default location of the on-disk memo
+DEFAULT_MEMO_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'FreqRespGraph', 'memo')
+
+# Bytes of trace data kept in memory
+MEMORY_SIZE = 256 * 1024 * 1024
+
+memoryTier = collections.OrderedDict()
+memoryBytes = 0
+
+# Lookups of this process
+counters = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+# Content hashes of files by path, modification time and size
+fileDigests = {}
+
+
+def fileDigest(filename):
+    st = os.stat(filename)
+    stat = (os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+    if stat not in fileDigests:
+        h = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        fileDigests[stat] = h.hexdigest()
+    return fileDigests[stat]
+
+
+def arrayDigest(*arrays):
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+# Key of the traces derived from filename using given pipeline.CurveOptions
+def curveKey(filename, options, isref, showpeq):
+    settings = {
+        'version': MEMO_VERSION,
+        'file': fileDigest(filename),
+        # Curve labels contain the file name
+        'name': os.path.basename(filename),
+        'isref': isref,
+        'showpeq': showpeq,
+        'align': [options.alignmin, options.alignmax, options.alignweight],
+        'csv_delimiter': options.csv_delimiter,
+        'ref': arrayDigest(options.ref.x, options.ref.y) if options.ref is not None else None,
+        'peq': arrayDigest(options.peq.srate, options.peq.a1, options.peq.a2, options.peq.b0, options.peq.b1, options.peq.b2) if options.peq is not None else None,
+        'zeq': arrayDigest(options.zeq.x, options.zeq.eq, options.zeq.resistances) if options.zeq is not None else None,
+        'smooth': [options.smooth, options.smoothstr, options.smoothonly],
+        'decimate': options.decimate,
+        'index': None,
+    }
+    if options.fromIndex(filename):
+        try:
+            settings['index'] = [os.path.abspath(options.index), os.stat(os.path.join(options.index, 'index.json')).st_mtime_ns]
+        except OSError:
+            pass
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+# Traces of key as list of dictionaries of Trace arguments, None if the key is not memoized
+def lookup(key, memodir=None):
+    if key in memoryTier:
+        memoryTier.move_to_end(key)
+        counters['hits'] += 1
+        return memoryTier[key]
+    if memodir:
+        traces = readTraces(os.path.join(memodir, key + '.npz'))
+        if traces is not None:
+            counters['disk_hits'] += 1
+            remember(key, traces)
+            return traces
+    counters['misses'] += 1
+    return None
+
+
+# Memoize traces (list of dictionaries of Trace arguments) of key, written to memodir if given
+def store(key, traces, memodir=None):
+    remember(key, traces)
+    if memodir:
+        os.makedirs(memodir, exist_ok=True)
+        writeTraces(os.path.join(memodir, key + '.npz'), traces)
+
+
+# Keep traces in memory, the arrays are shared by all lookups and made read-only
+def remember(key, traces):
+    global memoryBytes
+    for trace in traces:
+        trace['x'].flags.writeable = False
+        trace['y'].flags.writeable = False
+    memoryTier[key] = traces
+    memoryBytes += sum(t['x'].nbytes + t['y'].nbytes for t in traces)
+    while memoryBytes > MEMORY_SIZE and len(memoryTier) > 1:
+        key, dropped = memoryTier.popitem(last=False)
+        memoryBytes -= sum(t['x'].nbytes + t['y'].nbytes for t in dropped)
+
+
+def writeTraces(memofile, traces):
+    arrays = {}
+    for i, trace in enumerate(traces):
+        arrays['x%d' % i] = trace['x']
+        arrays['y%d' % i] = trace['y']
+    meta = [{k: v for k, v in trace.items() if k not in ('x', 'y')} for trace in traces]
+    arrays['meta'] = np.array(json.dumps(meta))
+    tmpfile = memofile + '.%d.tmp' % os.getpid()
+    with open(tmpfile, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmpfile, memofile)
+
+
+def readTraces(memofile):
+    try:
+        with np.load(memofile, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return [dict(m, x=data['x%d' % i], y=data['y%d' % i]) for i, m in enumerate(meta)]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# Return and clear counters, used to send the counters of worker processes to the main process
+def takeCounters():
+    taken = dict(counters)
+    for name in counters:
+        counters[name] = 0
+    return taken
+
+
+def addCounters(newcounters):
+    for name, count in newcounters.items():
+        counters[name] += count
+
+
+def clear():
+    global memoryBytes
+    memoryTier.clear()
+    memoryBytes = 0
@@ -0,0 +1,231 @@
+import math
+import os
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import least_squares
+import bq.biquad as bq
+import frg.pipeline as pipeline
+import frg.search as search
+import frg.smoothing as smoothing
+
+# Automatic PEQ fitting: choose filters whose combined response comes closest to the difference between reference
+# curve and measurement. Filters are added one by one, each time the candidate of a vectorized filter bank reducing
+# the error most is taken (greedy) and all filters are optimized together by least squares with analytic gradients.
+# Filters of the same type are kept MIN_DISTANCE apart: candidates close to a filter are left out, the least squares
+# fit penalizes closer filters and filters ending up closer than half of it are merged before the next one is added.
+
+# Parameter limits of fitted filters
+GAIN_MAX = 12
+Q_MIN = 0.1
+Q_MAX = 10
+
+# Frequency range fitted at most, measurements above 10 kHz vary too much between fittings of the headphone
+FIT_FMAX = 10000
+
+# Smoothing of the error curve if no smoothing is given
+FIT_SMOOTH = 1/12
+
+# Candidate filters of the greedy search: 1/3 octave spaced frequencies, these Q values for peak filters and shelf
+# filters (Q is ignored by shelf filters)
+CANDIDATE_POINTS_PER_OCTAVE = 3
+CANDIDATE_Q = (0.5, 1.0, 2.0, 4.0)
+CANDIDATE_GAIN = 6.0
+
+# Minimum distance in octaves between filters of the same type
+MIN_DISTANCE = 1/4
+PENALTY = 10
+
+
+# Filter of given parameters, frequency and Q given as log10 values
+def makeBiquad(typ, logfreq, logq, gain, srate):
+    return bq.Biquad(typ, 10**logfreq, srate, 10**logq, gain)
+
+
+# Error curve to be equalized: reference curve minus compensated, smoothed and aligned (or level matched) measurement
+# on a logarithmic grid within fmin...fmax. Returns grid and error without grid points outside of the data.
+def fitTarget(filename, options, fmin, fmax):
+    x, y = pipeline.loadCompensated(filename, options)
+    grid = smoothing.logGrid(float(fmin), float(fmax))
+    y = smoothing.resampleCurves([(x, y)], grid)
+    y = smoothing.smoothMatrix(grid, y, options.smooth if options.smooth > 0 else FIT_SMOOTH)
+    y = search.alignMatrix(grid, y, options.alignmin, options.alignmax)[0]
+    valid = ~np.isnan(y)
+    y = y[valid]
+    if options.alignmin <= 0 and len(y) > 0:
+        y = y - np.mean(y)
+    return grid[valid], -y
+
+
+# Mask of filters of the same type as typ less than distance octaves away from log10 frequency logfreq
+def closeFilters(types, params, typ, logfreq, distance=MIN_DISTANCE):
+    return (np.array(types) == typ) & (np.abs(params[0::3] - logfreq) < distance * math.log10(2))
+
+
+# Greedy choice of next filter: the candidate whose response, scaled to its least squares gain, reduces the residual
+# most. Candidates close to a filter of the same type in types and params are left out. Returns type, log10 frequency,
+# log10 Q and gain, None if no candidate is left.
+def bestCandidate(grid, residual, srate, fmin, fmax, types, params):
+    freqs = smoothing.logGrid(float(fmin), float(fmax), CANDIDATE_POINTS_PER_OCTAVE)
+    candidates = [(bq.Biquad.PEAK, f, q) for f in freqs for q in CANDIDATE_Q]
+    candidates += [(typ, f, 1 / math.sqrt(2)) for typ in (bq.Biquad.LOWSHELF, bq.Biquad.HIGHSHELF) for f in freqs]
+    candidates = [(typ, f, q) for typ, f, q in candidates if not np.any(closeFilters(types, params, typ, math.log10(f)))]
+    if len(candidates) == 0:
+        return None
+    shapes = bq.BiquadBank([bq.Biquad(typ, f, srate, q, CANDIDATE_GAIN) for typ, f, q in candidates]).log_results(grid) / CANDIDATE_GAIN
+    norm = np.sum(shapes * shapes, axis=1)
+    gains = np.clip(shapes @ residual / norm, -GAIN_MAX, GAIN_MAX)
+    # Error reduction of each candidate with its gain
+    reduction = 2 * gains * (shapes @ residual) - gains * gains * norm
+    best = int(np.argmax(reduction))
+    typ, f, q = candidates[best]
+    return typ, math.log10(f), math.log10(q), float(gains[best])
+
+
+# Merge filters of the same type closer than half of MIN_DISTANCE into the one with more gain, returns the remaining
+# types and params
+def mergeClose(types, params):
+    keep = np.ones(len(types), dtype=bool)
+    for i in np.argsort(-np.abs(params[2::3]), kind='stable'):
+        if keep[i]:
+            close = closeFilters(types, params, types[i], params[3*i], MIN_DISTANCE / 2)
+            close[i] = False
+            keep[close] = False
+    return [typ for typ, k in zip(types, keep) if k], params.reshape(-1, 3)[keep].ravel()
+
+
+# Derivatives of the prescaled constants (see Biquad.constants()) of a peak or shelf filter with respect to log10
+# frequency, log10 Q and gain, one row per parameter. Differentiated from the RBJ formulas of bq.Biquad: the constants
+# before scaling by a0 depend on omega, alpha and A, which depend on the parameters.
+def constantGradients(typ, logfreq, logq, gain, srate):
+    q = 10**logq
+    A = 10**(gain / 40)
+    omega = 2 * math.pi * 10**logfreq / srate
+    sn = math.sin(omega)
+    cs = math.cos(omega)
+    alpha = sn / (2*q)
+    beta = math.sqrt(A + A)
+    dbeta = beta / (2*A)
+    # b0, b1, b2, a0, a1, a2 and their partial derivatives by omega, alpha and A
+    if typ == bq.Biquad.PEAK:
+        const = [1 + alpha*A, -2*cs, 1 - alpha*A, 1 + alpha/A, -2*cs, 1 - alpha/A]
+        partial = [[0, A, alpha], [2*sn, 0, 0], [0, -A, -alpha], [0, 1/A, -alpha/A**2], [2*sn, 0, 0], [0, -1/A, alpha/A**2]]
+    elif typ == bq.Biquad.LOWSHELF:
+        const = [A*((A+1) - (A-1)*cs + beta*sn), 2*A*((A-1) - (A+1)*cs), A*((A+1) - (A-1)*cs - beta*sn),
+                 (A+1) + (A-1)*cs + beta*sn, -2*((A-1) + (A+1)*cs), (A+1) + (A-1)*cs - beta*sn]
+        partial = [[A*((A-1)*sn + beta*cs), 0, const[0]/A + A*(1 - cs + dbeta*sn)],
+                   [2*A*(A+1)*sn, 0, const[1]/A + 2*A*(1 - cs)],
+                   [A*((A-1)*sn - beta*cs), 0, const[2]/A + A*(1 - cs - dbeta*sn)],
+                   [-(A-1)*sn + beta*cs, 0, 1 + cs + dbeta*sn],
+                   [2*(A+1)*sn, 0, -2*(1 + cs)],
+                   [-(A-1)*sn - beta*cs, 0, 1 + cs - dbeta*sn]]
+    elif typ == bq.Biquad.HIGHSHELF:
+        const = [A*((A+1) + (A-1)*cs + beta*sn), -2*A*((A-1) + (A+1)*cs), A*((A+1) + (A-1)*cs - beta*sn),
+                 (A+1) - (A-1)*cs + beta*sn, 2*((A-1) - (A+1)*cs), (A+1) - (A-1)*cs - beta*sn]
+        partial = [[A*(-(A-1)*sn + beta*cs), 0, const[0]/A + A*(1 + cs + dbeta*sn)],
+                   [2*A*(A+1)*sn, 0, const[1]/A - 2*A*(1 + cs)],
+                   [A*(-(A-1)*sn - beta*cs), 0, const[2]/A + A*(1 + cs - dbeta*sn)],
+                   [(A-1)*sn + beta*cs, 0, 1 - cs + dbeta*sn],
+                   [2*(A+1)*sn, 0, 2*(1 - cs)],
+                   [(A-1)*sn - beta*cs, 0, 1 - cs - dbeta*sn]]
+    else:
+        raise ValueError('Only peak and shelf filters are fitted')
+    const = np.array(const)
+    # Derivatives of omega, alpha and A by log10 frequency, log10 Q and gain
+    ln10 = math.log(10)
+    inner = np.array([[omega*ln10, 0, 0], [cs / (2*q) * omega*ln10, -alpha*ln10, 0], [0, 0, A*ln10/40]])
+    dconst = np.array(partial) @ inner
+    # Quotient rule for the scaling by a0
+    dscaled = (dconst - np.outer(const / const[3], dconst[3])) / const[3]
+    # Order of Biquad.constants(): a1, a2, b0, b1, b2
+    return dscaled[[4, 5, 0, 1, 2]].T
+
+
+# Optimize all filters together. params holds log10 frequency, log10 Q and gain of each filter.
+def refine(grid, target, types, params, srate, fmin, fmax):
+    n = len(types)
+    lower = np.tile([math.log10(fmin), math.log10(Q_MIN), -GAIN_MAX], n)
+    upper = np.tile([math.log10(fmax), math.log10(Q_MAX), GAIN_MAX], n)
+    params = np.clip(params, lower + 1e-9, upper - 1e-9)
+
+    def biquads(p):
+        return [makeBiquad(types[i], p[3*i], p[3*i+1], p[3*i+2], srate) for i in range(n)]
+
+    # Filters of the same type closer than MIN_DISTANCE are penalized like an error of PENALTY dB at all grid points
+    pairs = np.array([(i, j) for i in range(n) for j in range(i) if types[i] == types[j]], dtype=int).reshape(-1, 2)
+    mindist = MIN_DISTANCE * math.log10(2)
+    weight = PENALTY * math.sqrt(len(grid)) / mindist
+
+    def distances(p):
+        return p[3*pairs[:, 0]] - p[3*pairs[:, 1]]
+
+    def residual(p):
+        return np.concatenate((bq.BiquadBank(biquads(p)).log_result(grid) - target, weight * np.maximum(0, mindist - np.abs(distances(p)))))
+
+    # Analytic gradient of the responses with respect to the filter constants, chained with the analytic derivatives
+    # of the constants with respect to the filter parameters
+    def jacobian(p):
+        gradients = bq.BiquadBank(biquads(p)).log_gradients(grid)
+        jac = np.zeros((len(grid) + len(pairs), 3 * n))
+        for i in range(n):
+            jac[:len(grid), 3*i:3*i+3] = (constantGradients(types[i], *p[3*i:3*i+3], srate) @ gradients[i]).T
+        d = distances(p)
+        slope = np.where(np.abs(d) < mindist, -weight * np.sign(d), 0)
+        rows = len(grid) + np.arange(len(pairs))
+        jac[rows, 3*pairs[:, 0]] = slope
+        jac[rows, 3*pairs[:, 1]] = -slope
+        return jac
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        result = least_squares(residual, params, jac=jacobian, bounds=(lower, upper), method='trf', max_nfev=200)
+    return result.x
+
+
+# Fit nfilters PEQ filters simulated at sampling frequency srate to equalize the measurement to the reference curve
+# of options within fmin...fmax. Returns the filters with rounded parameters as printed in --peq syntax.
+def fitFile(filename, options, nfilters, fmin=20, fmax=FIT_FMAX, srate=48000):
+    fmax = min(fmax, FIT_FMAX)
+    grid, target = fitTarget(filename, options, fmin, fmax)
+    if len(grid) < 2:
+        return []
+    types = []
+    params = np.empty(0)
+    # Merged filters are replaced by new ones, at most nfilters times
+    for i in range(2 * nfilters):
+        if len(types) == nfilters:
+            break
+        residual = target - (bq.BiquadBank([makeBiquad(types[j], *params[3*j:3*j+3], srate) for j in range(len(types))]).log_result(grid) if len(types) > 0 else 0)
+        candidate = bestCandidate(grid, residual, srate, fmin, fmax, types, params)
+        if candidate is None:
+            break
+        typ, logfreq, logq, gain = candidate
+        types.append(typ)
+        params = refine(grid, target, types, np.append(params, [logfreq, logq, gain]), srate, fmin, fmax)
+        merged, params = mergeClose(types, params)
+        while len(merged) < len(types):
+            types = merged
+            params = refine(grid, target, types, params, srate, fmin, fmax)
+            merged, params = mergeClose(types, params)
+    biquads = []
+    for i, typ in enumerate(types):
+        q = 10**params[3*i+1] if typ == bq.Biquad.PEAK else 1 / math.sqrt(2)
+        biquads.append(bq.Biquad(typ, round(10**params[3*i]), srate, round(q, 2), round(params[3*i+2], 1)))
+    return biquads
+
+
+def fitWorker(filename, nfilters, fmin, fmax, srate):
+    return fitFile(filename, pipeline.workerOptions, nfilters, fmin, fmax, srate)
+
+
+# Fit PEQ filters for all given files, in parallel using jobs worker processes if jobs > 1 (0 = number of CPU cores).
+# Returns list of filters per file in the order of files.
+def fitFiles(files, options, nfilters, fmin=20, fmax=FIT_FMAX, srate=48000, jobs=1):
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(files))
+    if jobs <= 1:
+        return [fitFile(f, options, nfilters, fmin, fmax, srate) for f in files]
+    n = len(files)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=pipeline.initWorker, initargs=(options,)) as pool:
+        return list(pool.map(fitWorker, files, [nfilters] * n, [fmin] * n, [fmax] * n, [srate] * n))
@@ -0,0 +1,83 @@
+import numpy as np
+import frg.pipeline as pipeline
+import frg.smoothing as smoothing
+
+# Phase views: phase and group delay of the PEQ filter chain calculated from its complex response, and the minimum
+# phase of measured curves derived from their magnitude. Magnitude measurements contain no phase, but headphones and
+# PEQ filters are close to minimum phase systems whose phase is given by the magnitude (Hilbert transform of the log
+# magnitude, calculated here by folding the real cepstrum).
+
+VIEWS = ('spl', 'phase', 'groupdelay', 'minphase')
+
+# FFT size of the minimum phase calculation, gives about 0.7 Hz resolution up to 24 kHz
+MINPHASE_FFT_SIZE = 1 << 16
+
+
+# Minimum phase in degrees of a curve given by frequencies x and dB values y. The curve is held constant below its
+# lowest and above its highest frequency up to the nyquist frequency (at least the highest frequency of the curve).
+# Points at 0 Hz or without finite value are NaN.
+def minimumPhase(x, y, nyquist=0, n=MINPHASE_FFT_SIZE):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = (x > 0) & np.isfinite(y)
+    result = np.full(len(x), np.nan)
+    x = x[valid]
+    y = y[valid]
+    if len(x) < 2:
+        result[valid] = 0
+        return result
+    m = n // 2 + 1
+    grid = np.linspace(0, max(nyquist, x[-1]), m)
+    logmag = np.interp(np.log(np.maximum(grid, x[0])), np.log(x), y) * (np.log(10) / 20)
+    cepstrum = np.fft.ifft(np.concatenate((logmag, logmag[-2:0:-1]))).real
+    # Causal part of the cepstrum gives the minimum phase spectrum
+    folded = np.zeros(n)
+    folded[0] = cepstrum[0]
+    folded[1:n // 2] = 2 * cepstrum[1:n // 2]
+    folded[n // 2] = cepstrum[n // 2]
+    phase = np.unwrap(np.imag(np.fft.fft(folded))[:m])
+    result[valid] = np.degrees(np.interp(x, grid, phase))
+    return result
+
+
+# Traces of the PEQ filter chain and its single filters in given view on a logarithmic grid within fmin...fmax
+def peqTraces(peq, view, fmin, fmax, labels):
+    grid = smoothing.logGrid(float(fmin), float(fmax))
+    if view == 'groupdelay':
+        total = peq.group_delay(grid) * 1000
+        single = peq.group_delays(grid) * 1000
+    else:
+        total = np.degrees(peq.phase(grid))
+        single = np.degrees(peq.phases(grid))
+    traces = [pipeline.Trace(grid, total, 'Equalizer', kind='equalizer')]
+    if len(peq) > 1:
+        for i, label in enumerate(labels):
+            traces.append(pipeline.Trace(grid, single[i], 'Filter ' + str(i + 1) + ': ' + label, '--', kind='peq_filter', index=i))
+    return traces
+
+
+# Traces of given view: the magnitude traces are replaced by their minimum phase ('minphase'), or by phase or group
+# delay of the PEQ ('phase', 'groupdelay'). The calculated PEQ phase is added to the minimum phase view for comparison.
+def viewTraces(traces, view, peq, fmin, fmax, nyquist, labels=()):
+    if view == 'spl':
+        return traces
+    if view != 'minphase':
+        return peqTraces(peq, view, fmin, fmax, labels)
+    result = []
+    for t in traces:
+        if t.kind == 'impedance':
+            continue
+        # Aggregates of curves not covering the whole grid contain NaN
+        valid = (t.x > 0) & np.isfinite(t.y)
+        result.append(pipeline.Trace(t.x[valid], minimumPhase(t.x[valid], t.y[valid], nyquist), t.label + ' (minimum phase)', t.fmt, t.kind, t.source, t.index, t.color))
+    if peq is not None:
+        trace = peqTraces(peq, 'phase', fmin, fmax, labels)[0]
+        trace.label = 'Equalizer phase (calculated)'
+        trace.fmt = ':'
+        result.append(trace)
+    return result
+
+
+# Y-Axis label of view
+def viewLabel(view):
+    return {'phase': 'Phase [deg]', 'groupdelay': 'Group delay [ms]', 'minphase': 'Minimum phase [deg]'}.get(view, '')
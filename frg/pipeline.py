@@ -0,0 +1,205 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import frg.csvdata as csvdata
+import frg.curvedb as curvedb
+import frg.curves as curves
+import frg.memo as memo
+import frg.profiling as profiling
+import frg.smoothing as smoothing
+
+
+# Processing options shared by all curves of a graph
+class CurveOptions:
+
+    def __init__(self, alignmin=-1, alignmax=-1, csv_delimiter=',', ref=None, peq=None, zeq=None, smooth=-1, smoothstr='', smoothonly=False, cachedir=csvdata.DEFAULT_CACHE_DIR, index=None, decimate=None, memodir=None, alignweight='points', indexed=frozenset()):
+        self.alignmin = alignmin
+        self.alignmax = alignmax
+        # Weighting of the alignment range (curves.ALIGN_WEIGHTINGS)
+        self.alignweight = alignweight
+        self.csv_delimiter = csv_delimiter
+        # Prepared reference curve used for compensation (curves.RefCurve)
+        self.ref = ref
+        # PEQ filter chain (bq.BiquadBank)
+        self.peq = peq
+        # Impedance EQ (impedance.ImpedanceEq)
+        self.zeq = zeq
+        self.smooth = smooth
+        self.smoothstr = smoothstr
+        self.smoothonly = smoothonly
+        # Parsed CSV files and derived curves are only cached if cachedir is set
+        self.cachedir = cachedir
+        # Measurement index directory, the files selected from the index (absolute paths) are taken from the index
+        # instead of reading the CSV file. Files given by --files are always read.
+        self.index = index
+        self.indexed = indexed
+        # Reduce CSV files to logarithmic frequency bins while reading, (mode, bins per octave) or None
+        self.decimate = decimate
+        # Directory of memoized derived curves, None keeps them in memory only
+        self.memodir = memodir
+
+    # Check if the curve of filename is taken from the measurement index
+    def fromIndex(self, filename):
+        return bool(self.index) and os.path.abspath(filename) in self.indexed
+
+
+# Curve to be drawn, fmt is the matplotlib format string. kind tells how the curve was derived from the CSV file
+# source: 'curve', 'ref', 'zeq', 'peq', 'smoothed', 'zeq_smoothed', 'peq_smoothed', 'equalizer' or 'impedance',
+# index is the resistance index of impedance related curves. Statistical aggregates use kind 'mean' or 'median'.
+# color overrides the color cycle if given. options are the CurveOptions the source was processed with, kept by the
+# graph for interactive changes.
+class Trace:
+
+    def __init__(self, x, y, label, fmt='-', kind='curve', source=None, index=0, color=None):
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+        self.label = label
+        self.fmt = fmt
+        self.kind = kind
+        self.source = source
+        self.index = index
+        self.color = color
+        self.options = None
+
+
+# Label of impedance equalized curve, the resistance is only shown if multiple resistances are compared
+def zeqLabel(zeq, i):
+    if len(zeq) == 1:
+        return 'Impedance equalized'
+    return 'Impedance equalized ' + str(float(zeq.resistances[i])) + ' Ohm'
+
+
+# Impedance EQ curves to be drawn
+def impedanceTraces(zeq):
+    return [Trace(zeq.x, zeq.eq[i], 'EQ by impedance ('+ str(float(r)) +' Ohm source)', kind='impedance', index=i) for i, r in enumerate(zeq.resistances)]
+
+
+# Read CSV file or its resampled curve from the measurement index (if selected from the index and unchanged since
+# indexing) and compensate values according to reference curve if given
+def loadCompensated(filename, options):
+    with profiling.stage('read', filename) as record:
+        curve = curvedb.loadCurve(options.index, filename) if options.fromIndex(filename) else None
+        if curve is None:
+            curve = csvdata.loadCurve(filename, options.csv_delimiter, options.cachedir, options.decimate)
+        x, y = curve
+        record['points'] = len(x)
+    if options.ref is not None:
+        with profiling.stage('compensate', filename, len(x)):
+            x, y = curves.compensateCurve(x, y, options.ref)
+    return x, y
+
+
+# Calculate all curves to be drawn for given CSV file: compensated, aligned, smoothed and equalized curves, the
+# equalizer curve if showpeq is set. Returns the traces in drawing order.
+def deriveCurve(filename, options, isref=False, showpeq=False):
+    traces = []
+    name = os.path.basename(filename)
+    x, y = loadCompensated(filename, options)
+
+    # Align data
+    if options.alignmin > 0:
+        with profiling.stage('align', filename, len(x)):
+            y = y - curves.alignOffset(x, y, options.alignmin, options.alignmax, options.alignweight)
+
+    zeq = options.zeq
+    peq = options.peq
+
+    # Smooth data
+    if options.smooth > 0 and not isref :
+        with profiling.stage('smooth', filename, len(x)):
+            x_smoothed, y_smoothed = smoothing.smoothCurve(x, y, options.smooth)
+        # Smoothed curve
+        traces.append(Trace(x_smoothed, y_smoothed, name+' ('+ options.smoothstr + ' oct smoothed)', kind='smoothed', source=filename))
+        if zeq is not None:
+            # Impedance equalized smoothed curve(s)
+            with profiling.stage('impedance', filename, len(x_smoothed)):
+                y_zeq = zeq.apply(x_smoothed, y_smoothed)
+            for i, yz in enumerate(y_zeq):
+                traces.append(Trace(x_smoothed, yz, name+' (' + zeqLabel(zeq, i) + ', ' + options.smoothstr + ' oct smoothed)', kind='zeq_smoothed', source=filename, index=i))
+        if peq is not None:
+            # Apply biquad PEQ to smoothed curve
+            with profiling.stage('peq', filename, len(x_smoothed)):
+                y_peq = y_smoothed + peq.log_result(x_smoothed)
+            traces.append(Trace(x_smoothed, y_peq, name+' (Equalized, ' + options.smoothstr + ' oct smoothed)', kind='peq_smoothed', source=filename))
+
+    # PEQ
+    if showpeq:
+        with profiling.stage('peq', filename, len(x)):
+            y_peq = peq.log_result(x)
+        traces.append(Trace(x, y_peq, 'Equalizer', kind='equalizer', source=filename))
+
+    if options.smooth > 0 and options.smoothonly:
+        # Don't show raw curve(s)
+        return traces
+
+    if isref:
+        # Reference curve
+        traces.append(Trace(x, y, name, '--k', kind='ref', source=filename))
+    else:
+        # Curve
+        traces.append(Trace(x, y, name, source=filename))
+        if zeq is not None:
+            # Impedance equalized curve(s)
+            with profiling.stage('impedance', filename, len(x)):
+                y_zeq = zeq.apply(x, y)
+            for i, yz in enumerate(y_zeq):
+                traces.append(Trace(x, yz, name+' (' + zeqLabel(zeq, i) + ')', kind='zeq', source=filename, index=i))
+        if peq is not None:
+            # Apply biquad PEQ
+            with profiling.stage('peq', filename, len(x)):
+                y_peq = y + peq.log_result(x)
+            traces.append(Trace(x, y_peq, name+' (Equalized)', kind='peq', source=filename))
+    return traces
+
+
+# Process CSV file like deriveCurve(), traces of unchanged files processed the same way before are taken from the memo
+def processCurve(filename, options, isref=False, showpeq=False):
+    if options.cachedir is None:
+        return deriveCurve(filename, options, isref, showpeq)
+    key = memo.curveKey(filename, options, isref, showpeq)
+    traces = memo.lookup(key, options.memodir)
+    if traces is None:
+        traces = deriveCurve(filename, options, isref, showpeq)
+        memo.store(key, [{k: v for k, v in vars(trace).items() if k != 'options'} for trace in traces], options.memodir)
+        return traces
+    return [Trace(**dict(trace, source=filename if trace['source'] is not None else None)) for trace in traces]
+
+
+# Remember the processing options of the traces of a file. Set in the main process, so the options aren't sent back
+# by the worker processes with every trace.
+def withOptions(traces, options):
+    for trace in traces:
+        trace.options = options
+    return traces
+
+
+# Options of the worker processes, set once per process instead of sending them with every file
+workerOptions = None
+
+
+def initWorker(options, profile=False, tracemem=False):
+    global workerOptions
+    workerOptions = options
+    profiling.initWorker(profile, tracemem)
+
+
+# Process file in worker process, returns traces, profiling records and memo counters
+def processWorker(filename, showpeq):
+    return processCurve(filename, workerOptions, False, showpeq), profiling.takeRecords(), memo.takeCounters()
+
+
+# Process given CSV files, using a pool of jobs worker processes if jobs > 1 (0 = number of CPU cores). The equalizer
+# curve is added to the first file if showpeq is set. Returns the list of traces per file in the order of files.
+def processFiles(files, options, jobs=1, showpeq=False):
+    showpeqs = [showpeq and i == 0 for i in range(len(files))]
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(files))
+    if jobs <= 1:
+        return [processCurve(f, options, False, s) for f, s in zip(files, showpeqs)]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=(options, profiling.enabled(), profiling.traceMemory)) as pool:
+        results = list(pool.map(processWorker, files, showpeqs, chunksize=max(1, len(files) // (4 * jobs))))
+    for traces, records, counters in results:
+        profiling.addRecords(records)
+        memo.addCounters(counters)
+    return [traces for traces, records, counters in results]
@@ -0,0 +1,179 @@
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+import frg.memo as memo
+
+# Optional instrumentation of the processing stages. Each stage records wall time, number of points, peak memory and
+# the processed file. Without --profile stage() only yields a record which is thrown away.
+
+HOOKS = ('cprofile', 'tracemalloc')
+
+# Stage records of this process, None if profiling is disabled
+records = None
+
+# Peak memory of stages is taken from tracemalloc if tracing is enabled. Otherwise the growth of the peak process
+# size during the stage is recorded, the peak process size itself only grows and would be the same for all stages
+# after the largest one.
+traceMemory = False
+
+# Traced peaks of the open stages reached before their nested stages reset the tracemalloc peak
+openPeaks = []
+
+# Profiler of cProfile hook
+profiler = None
+
+# Start time of profiled run
+startTime = 0
+
+
+# Enable profiling of this process, drops records inherited from a parent process
+def enable(tracemem=False):
+    global records, traceMemory, startTime
+    records = []
+    traceMemory = tracemem
+    if tracemem and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    startTime = time.perf_counter()
+
+
+def enabled():
+    return records is not None
+
+
+# Initializer of worker processes, profiling is enabled if it is enabled in the main process
+def initWorker(profile, tracemem):
+    global records
+    if profile:
+        enable(tracemem)
+    else:
+        records = None
+
+
+# Peak process size in MB, None if not available (e.g. Windows)
+def peakRss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+# Record processing stage, the number of points can be set using record['points'] within the stage
+@contextlib.contextmanager
+def stage(name, filename='', points=0):
+    record = {'stage': name, 'file': filename, 'points': points}
+    if records is None:
+        yield record
+        return
+    if traceMemory:
+        if len(openPeaks) > 0:
+            openPeaks[-1] = max(openPeaks[-1], tracemalloc.get_traced_memory()[1])
+        openPeaks.append(0)
+        tracemalloc.reset_peak()
+    else:
+        rss = peakRss()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['time'] = time.perf_counter() - start
+        if traceMemory:
+            peak = max(tracemalloc.get_traced_memory()[1], openPeaks.pop())
+            # Enclosing stage keeps the peak of this stage
+            if len(openPeaks) > 0:
+                openPeaks[-1] = max(openPeaks[-1], peak)
+            record['peak_memory'] = peak / (1024 * 1024)
+        else:
+            record['peak_memory'] = peakRss() - rss if rss is not None else None
+        records.append(record)
+
+
+# Return and clear records, used to send the records of worker processes to the main process
+def takeRecords():
+    global records
+    if records is None:
+        return []
+    taken = records
+    records = []
+    return taken
+
+
+def addRecords(newrecords):
+    if records is not None:
+        records.extend(newrecords)
+
+
+# Start cProfile or tracemalloc hook
+def startHook(hook):
+    global profiler
+    if hook == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif hook == 'tracemalloc':
+        tracemalloc.start()
+
+
+# Stop hook and print the functions taking most time or the lines allocating most memory
+def stopHook(hook, limit=25):
+    global profiler
+    if hook == 'cprofile' and profiler is not None:
+        import pstats
+        profiler.disable()
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(limit)
+        profiler = None
+    elif hook == 'tracemalloc' and tracemalloc.is_tracing():
+        print( 'Top memory allocations:')
+        for statistic in tracemalloc.take_snapshot().statistics('lineno')[:limit]:
+            print( statistic)
+        tracemalloc.stop()
+
+
+# Summary per stage: calls, points, total time and largest peak memory (or RSS growth), in order of first appearance
+def summary():
+    stages = {}
+    for record in records or []:
+        s = stages.setdefault(record['stage'], {'stage': record['stage'], 'calls': 0, 'points': 0, 'time': 0.0, 'peak_memory': None})
+        s['calls'] += 1
+        s['points'] += record['points']
+        s['time'] += record['time']
+        if record['peak_memory'] is not None:
+            s['peak_memory'] = max(s['peak_memory'] or 0, record['peak_memory'])
+    return list(stages.values())
+
+
+# Total time per file, slowest first
+def fileTimes():
+    files = {}
+    for record in records or []:
+        if record['file'] != '':
+            files[record['file']] = files.get(record['file'], 0) + record['time']
+    return sorted(files.items(), key=lambda item: -item[1])
+
+
+# Print summary table or write all records as JSON if a file name is given ('-' prints only)
+def report(output='-', slowest=5):
+    if records is None:
+        return
+    walltime = time.perf_counter() - startTime
+    memory = 'Peak traced [MB]' if traceMemory else 'RSS growth [MB]'
+    print( '%-12s %7s %10s %10s %16s' % ('Stage', 'Calls', 'Points', 'Time [s]', memory))
+    for s in summary():
+        print( '%-12s %7d %10d %10.4f %16s' % (s['stage'], s['calls'], s['points'], s['time'], '' if s['peak_memory'] is None else '%.1f' % s['peak_memory']))
+    print( 'Total wall time: %.4f s' % walltime)
+    if not traceMemory and peakRss() is not None:
+        print( 'Peak RSS: %.1f MB' % peakRss())
+    print( 'Memoized curves: %d hits, %d disk hits, %d misses' % (memo.counters['hits'], memo.counters['disk_hits'], memo.counters['misses']))
+    files = fileTimes()
+    if len(files) > 0:
+        print( 'Slowest files:')
+        for filename, t in files[:slowest]:
+            print( '%10.4f s  %s' % (t, filename))
+    if output != '-':
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'wall_time': walltime, 'memory': 'traced' if traceMemory else 'rss_growth', 'peak_rss': peakRss(), 'stages': summary(), 'memo': memo.counters, 'records': records}, f, indent=1)
+        print( 'Profile written to ', output)
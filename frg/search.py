@@ -0,0 +1,111 @@
+import copy
+import warnings
+import numpy as np
+import frg.csvdata as csvdata
+import frg.curvedb as curvedb
+import frg.smoothing as smoothing
+import frg.stats as stats
+
+# Nearest match search: all candidate curves are compared with a target curve on the shared grid of the measurement
+# index in a single pass over the curve matrix. Indexed curves are taken from the index matrix, other files are read
+# and resampled first.
+
+METRICS = ('rms', 'preference')
+
+# Frequency range of the headphone preference model by Olive, Welti and Khonsaripour (2013)
+PREFERENCE_FMIN = 50
+PREFERENCE_FMAX = 10000
+
+
+# Align each row of curve matrix on grid to 0 dB at alignmin or within alignmin...alignmax like curves.alignOffset(),
+# the points of the logarithmic grid already weight every octave equally
+def alignMatrix(grid, matrix, alignmin, alignmax):
+    if alignmin <= 0:
+        return matrix
+    if alignmax > 0:
+        columns = (grid > alignmin) & (grid < alignmax)
+    else:
+        columns = np.arange(len(grid)) == np.argmin(np.abs(grid - alignmin))
+    if not np.any(columns):
+        return matrix
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        offset = np.nanmean(matrix[:, columns], axis=1)
+    return matrix - np.nan_to_num(offset)[:, None]
+
+
+# Curve matrix of given files on the index grid, not aligned or smoothed. Files selected from the index are copied
+# from the index unless they changed since indexing.
+def candidateMatrix(files, options, grid, jobs=1):
+    matrix = np.full((len(files), len(grid)), np.nan, dtype=np.float32)
+    index = curvedb.openIndex(options.index) if options.index else None
+    rows = [index.row(f) if index is not None and options.fromIndex(f) else None for f in files]
+    indexed = [i for i, row in enumerate(rows) if row is not None]
+    if len(indexed) > 0:
+        matrix[indexed] = index.matrix[[rows[i] for i in indexed]]
+    other = [i for i, row in enumerate(rows) if row is None]
+    if len(other) > 0:
+        rawoptions = copy.copy(options)
+        rawoptions.alignmin = -1
+        rawoptions.smooth = -1
+        matrix[other] = stats.loadMatrix([files[i] for i in other], rawoptions, grid, jobs)
+    return matrix
+
+
+# RMS deviation in dB of each row from target within fmin...fmax. Unaligned curves are level matched first.
+def rmsError(grid, matrix, target, fmin, fmax, aligned):
+    columns = (grid >= fmin) & (grid <= fmax)
+    error = matrix[:, columns] - target[None, columns]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if not aligned:
+            error = error - np.nanmean(error, axis=1)[:, None]
+        return np.sqrt(np.nanmean(error**2, axis=1))
+
+
+# Predicted preference of each row for target as used by the Harman over-ear headphone model:
+# 114.49 - 12.62 * standard deviation - 15.52 * absolute slope (per decade) of the error curve within 50...10000 Hz
+def preferenceScore(grid, matrix, target):
+    columns = (grid >= PREFERENCE_FMIN) & (grid <= PREFERENCE_FMAX)
+    error = matrix[:, columns] - target[None, columns]
+    valid = ~np.isnan(error)
+    n = np.sum(valid, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(valid, np.log10(grid[columns])[None, :], 0)
+        e = np.where(valid, error, 0)
+        mx = np.sum(x, axis=1) / n
+        me = np.sum(e, axis=1) / n
+        dx = np.where(valid, x - mx[:, None], 0)
+        de = np.where(valid, e - me[:, None], 0)
+        slope = np.sum(dx * de, axis=1) / np.sum(dx * dx, axis=1)
+        sd = np.sqrt(np.sum(de * de, axis=1) / (n - 1))
+    score = 114.49 - 12.62 * sd - 15.52 * np.abs(slope)
+    score[n < 3] = np.nan
+    return score
+
+
+# Rank given files by distance to target CSV file. Curves are aligned and smoothed according to options and compared
+# within fmin...fmax using metric 'rms' (lower is better) or 'preference' (higher is better). Returns list of
+# (file, score) of the top best matches.
+def findMatches(target, files, options, metric='rms', top=10, fmin=20, fmax=20000, jobs=1):
+    grid = curvedb.indexGrid()
+    xt, yt = csvdata.loadCurve(target, options.csv_delimiter, options.cachedir)
+    matrix = np.vstack((smoothing.resampleCurves([(xt, yt)], grid), candidateMatrix(files, options, grid, jobs)))
+    matrix = alignMatrix(grid, matrix.astype(np.float64), options.alignmin, options.alignmax)
+    if options.smooth > 0:
+        matrix = smoothing.smoothMatrix(grid, matrix, options.smooth)
+    if metric == 'preference':
+        scores = preferenceScore(grid, matrix[1:], matrix[0])
+        order = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind='stable')
+    else:
+        scores = rmsError(grid, matrix[1:], matrix[0], fmin, fmax, options.alignmin > 0)
+        order = np.argsort(np.nan_to_num(scores, nan=np.inf), kind='stable')
+    order = [i for i in order[:top] if not np.isnan(scores[i])]
+    return [(files[i], float(scores[i])) for i in order]
+
+
+# Print ranking of matches
+def printMatches(matches, target, metric):
+    print( 'Best matches for ', target, ' (' + ('predicted preference' if metric == 'preference' else 'RMS deviation [dB]') + '):')
+    for rank, (filename, score) in enumerate(matches):
+        print( '%3d %8.2f  %s' % (rank + 1, score, filename))
@@ -0,0 +1,164 @@
+import glob
+import json
+import os
+import time
+import traceback
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import frg.api as api
+import frg.csvdata as csvdata
+import frg.memo as memo
+
+# Render server: a long running process rendering graphs on HTTP requests, so Python, numpy, scipy and matplotlib are
+# started once and parsed CSV files stay in memory. Graph settings are the job file settings (command line options
+# without leading '--'), either as query parameters or as JSON object posted to /render:
+#   GET  /render?files=a.csv&files=b.csv&alignmin=200&alignmax=2000&smooth=1/12&format=svg
+#   POST /render  {"files": ["a.csv", "b.csv"], "alignmin": 200, "alignmax": 2000, "format": "svg"}
+#   GET  /status
+# Options without value (e.g. &nolegend) are flags. Only plot options are accepted, options writing files or using
+# the measurement index are rejected. File names and patterns are relative to the data root of the server, files
+# outside of it can't be read. The server only listens on localhost by default. Requests are rendered one after
+# another into the same figure.
+
+DEFAULT_PORT = 8765
+DEFAULT_HOST = '127.0.0.1'
+
+# Plot options accepted in requests
+ALLOWED_OPTIONS = ('ymin', 'ymax', 'xmin', 'xmax', 'alignmin', 'alignmax', 'alignweight', 'hidealignment', 'refcurve',
+                   'nolegend', 'compensate', 'title', 'peq', 'fpeq', 'view', 'peqverify', 'hidepeq', 'smooth',
+                   'smoothonly', 'zeq_file', 'zeq_r', 'zeq_csvdelimiter', 'csvdelimiter', 'nocache', 'files',
+                   'maxlines', 'stats', 'percentiles', 'groupby', 'match', 'metric', 'top', 'peqfit', 'decimate',
+                   'decimatebins')
+
+# Options given by file names, 'files' also accepts glob patterns
+FILE_OPTIONS = ('files', 'refcurve', 'zeq_file', 'match')
+
+
+# Job of query string parameters, repeated parameters become lists
+def queryJob(query):
+    job = {}
+    for key, values in urllib.parse.parse_qs(query, keep_blank_values=True).items():
+        values = [True if v == '' else v for v in values]
+        job[key] = values[0] if len(values) == 1 else values
+    return job
+
+
+# Check if value doesn't look like a command line option, e.g. a list value '--cachedir=/tmp'
+def isPlainValue(value):
+    value = str(value)
+    if not value.startswith('-'):
+        return True
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+# Path of file name or pattern within data root, raises ValueError if it points outside of it
+def rootPath(pattern, root):
+    path = os.path.realpath(os.path.join(root, str(pattern)))
+    if os.path.commonpath([path, root]) != root:
+        raise ValueError('File outside of data root: ' + str(pattern))
+    return path
+
+
+# Check job settings of a request and resolve its files within data root, raises ValueError if the job is not
+# allowed. Files matching the patterns are returned escaped, so they aren't expanded again.
+def checkJob(job, root):
+    root = os.path.realpath(root)
+    for key, value in job.items():
+        if key not in ALLOWED_OPTIONS:
+            raise ValueError('Option not allowed: ' + key)
+        values = value if isinstance(value, list) else [value]
+        if not all(isPlainValue(v) for v in values if v is not True):
+            raise ValueError('Invalid value of ' + key + ': ' + str(value))
+    if 'match' in job and len(job.get('files', [])) == 0:
+        raise ValueError('match requires files, the measurement index is not available')
+    for key in FILE_OPTIONS:
+        if key not in job:
+            continue
+        if key == 'files':
+            files = []
+            for pattern in job[key] if isinstance(job[key], list) else [job[key]]:
+                for path in sorted(glob.glob(rootPath(pattern, root))):
+                    files.append(glob.escape(rootPath(path, root)))
+            job[key] = files
+        else:
+            job[key] = rootPath(job[key], root)
+    return job
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/status':
+            self.sendResponse(200, 'application/json', json.dumps(self.server.status()).encode('utf-8'))
+        elif url.path == '/render':
+            self.renderJob(queryJob(url.query))
+        else:
+            self.sendResponse(404, 'text/plain', b'Unknown path, use /render or /status')
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/render':
+            self.sendResponse(404, 'text/plain', b'Unknown path, use /render')
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(job, dict):
+                raise ValueError('Expected JSON object')
+        except ValueError as e:
+            self.sendResponse(400, 'text/plain', ('Invalid JSON: ' + str(e)).encode('utf-8'))
+            return
+        job.update(queryJob(url.query))
+        self.renderJob(job)
+
+    def renderJob(self, job):
+        fmt = job.pop('format', 'png')
+        try:
+            dpi = job.pop('dpi', 'figure')
+            dpi = dpi if dpi == 'figure' else float(dpi)
+            image = api.render(checkJob(job, self.server.root), fmt, dpi)
+        except ValueError as e:
+            self.sendResponse(400, 'text/plain', str(e).encode('utf-8'))
+            return
+        except Exception:
+            # Keep serving if a graph fails
+            traceback.print_exc()
+            self.sendResponse(500, 'text/plain', traceback.format_exc().encode('utf-8'))
+            return
+        self.server.rendered = self.server.rendered + 1
+        self.sendResponse(200, api.IMAGE_FORMATS[fmt], image)
+
+    def sendResponse(self, code, contenttype, body):
+        self.send_response(code)
+        self.send_header('Content-Type', contenttype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RenderServer(HTTPServer):
+
+    def __init__(self, address, root):
+        super().__init__(address, RenderHandler)
+        # Directory of the files that can be plotted
+        self.root = os.path.abspath(root)
+        self.started = time.time()
+        self.rendered = 0
+
+    def status(self):
+        return {'uptime': time.time() - self.started, 'rendered': self.rendered, 'cached_curves': len(csvdata.memoryCache), 'memo': dict(memo.counters, curves=len(memo.memoryTier), bytes=memo.memoryBytes)}
+
+
+# Serve render requests of files within root until interrupted
+def serve(port=DEFAULT_PORT, host=DEFAULT_HOST, root='.'):
+    server = RenderServer((host, port), root)
+    print( 'Serving graphs of ', server.root, ' on http://%s:%d/render' % (host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
@@ -0,0 +1,130 @@
+import collections
+import os
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import frg.curvedb as curvedb
+import frg.curves as curves
+import frg.pipeline as pipeline
+import frg.smoothing as smoothing
+
+# Statistical aggregates of many curves. The curves are read, compensated, aligned and smoothed in chunks of
+# CHUNK_SIZE files and resampled onto a shared logarithmic grid, so only the float32 curve matrix (e.g. 10000 curves
+# x 480 grid points = 19 MB) and a single chunk of full resolution curves are held in memory.
+
+# Number of files read and resampled at once
+CHUNK_SIZE = 256
+
+# Available aggregates and the ones shown by --stats without values
+STATS = ('mean', 'median', 'minmax', 'percentiles')
+DEFAULT_STATS = ('median', 'minmax', 'percentiles')
+
+# Curve grouping options, each group gets its own aggregates
+GROUPS = ('none', 'directory', 'source', 'type', 'vendor', 'model')
+
+# Opacity of min/max envelope and percentile bands
+ENVELOPE_ALPHA = 0.08
+BAND_ALPHA = 0.15
+
+
+# Area between two curves to be drawn
+class Band:
+
+    def __init__(self, x, lower, upper, label, color, alpha=BAND_ALPHA):
+        self.x = x
+        self.lower = lower
+        self.upper = upper
+        self.label = label
+        self.color = color
+        self.alpha = alpha
+
+
+# Read given files and resample them onto grid as float32 matrix, one curve per row
+def resampleChunk(files, options, grid):
+    data = []
+    for filename in files:
+        x, y = pipeline.loadCompensated(filename, options)
+        if options.alignmin > 0:
+            y = y - curves.alignOffset(x, y, options.alignmin, options.alignmax, options.alignweight)
+        data.append((x, y))
+    if options.smooth > 0:
+        grid, matrix = smoothing.smoothCurves(data, options.smooth, grid)
+    else:
+        matrix = smoothing.resampleCurves(data, grid)
+    return matrix.astype(np.float32)
+
+
+def resampleWorker(files, grid):
+    return resampleChunk(files, pipeline.workerOptions, grid)
+
+
+# Curve matrix of all given files, chunks are processed by jobs worker processes if jobs > 1 (0 = number of CPU cores)
+def loadMatrix(files, options, grid, jobs=1):
+    matrix = np.empty((len(files), len(grid)), dtype=np.float32)
+    chunks = [files[i:i + CHUNK_SIZE] for i in range(0, len(files), CHUNK_SIZE)]
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(chunks))
+    if jobs <= 1:
+        results = (resampleChunk(chunk, options, grid) for chunk in chunks)
+        for i, result in enumerate(results):
+            matrix[i * CHUNK_SIZE:i * CHUNK_SIZE + len(result)] = result
+        return matrix
+    with ProcessPoolExecutor(max_workers=jobs, initializer=pipeline.initWorker, initargs=(options,)) as pool:
+        for i, result in enumerate(pool.map(resampleWorker, chunks, [grid] * len(chunks))):
+            matrix[i * CHUNK_SIZE:i * CHUNK_SIZE + len(result)] = result
+    return matrix
+
+
+# Group name of a file
+def groupKey(filename, groupby):
+    if groupby == 'directory':
+        return os.path.dirname(filename)
+    source, typ, vendor, model = curvedb.parsePath(os.path.abspath(filename), os.sep)
+    return {'source': source, 'type': typ, 'vendor': vendor, 'model': model}.get(groupby, '')
+
+
+# Aggregates of curve matrix columns, returns dictionary of stat name and values (lower and upper curve for minmax,
+# list of (percentile, lower, upper) for percentiles). Grid points without data are NaN.
+def aggregate(matrix, stats, percentiles):
+    result = {}
+    with warnings.catch_warnings():
+        # All-NaN grid points outside of the frequency range of all curves
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if 'mean' in stats:
+            result['mean'] = np.nanmean(matrix, axis=0, dtype=np.float64)
+        if 'minmax' in stats:
+            result['minmax'] = (np.nanmin(matrix, axis=0).astype(np.float64), np.nanmax(matrix, axis=0).astype(np.float64))
+        q = sorted(set(p for p in percentiles if 0 < p < 50))
+        if 'median' in stats or ('percentiles' in stats and len(q) > 0):
+            values = np.nanpercentile(matrix, [50] + q + [100 - p for p in q], axis=0).astype(np.float64)
+            if 'median' in stats:
+                result['median'] = values[0]
+            if 'percentiles' in stats:
+                result['percentiles'] = [(p, values[1 + i], values[1 + len(q) + i]) for i, p in enumerate(q)]
+    return result
+
+
+# Aggregate curves of given files, optionally per group. Returns traces of mean and median curves and bands of min/max
+# envelope and percentiles, each group drawn in its own color.
+def aggregateFiles(files, options, grid, stats=DEFAULT_STATS, percentiles=(10, 25), groupby='none', jobs=1):
+    matrix = loadMatrix(files, options, grid, jobs)
+    groups = collections.OrderedDict()
+    for i, filename in enumerate(files):
+        groups.setdefault(groupKey(filename, groupby) if groupby != 'none' else '', []).append(i)
+    traces = []
+    bands = []
+    for n, (key, rows) in enumerate(groups.items()):
+        color = 'C' + str(n % 10)
+        prefix = key + ': ' if groupby != 'none' else ''
+        count = ' (' + str(len(rows)) + ' curves)'
+        result = aggregate(matrix[rows] if len(groups) > 1 else matrix, stats, percentiles)
+        if 'mean' in result:
+            traces.append(pipeline.Trace(grid, result['mean'], prefix + 'Mean' + count, kind='mean', color=color))
+        if 'median' in result:
+            traces.append(pipeline.Trace(grid, result['median'], prefix + 'Median' + count, '--' if 'mean' in result else '-', kind='median', color=color))
+        if 'minmax' in result:
+            bands.append(Band(grid, result['minmax'][0], result['minmax'][1], prefix + 'Min...Max', color, ENVELOPE_ALPHA))
+        for p, lower, upper in result.get('percentiles', []):
+            bands.append(Band(grid, lower, upper, prefix + ('%g...%g %%' % (p, 100 - p)), color))
+    return traces, bands